@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Hammer /api/match_event from several processes, like gunicorn -w 4, while
+# another process runs full rebuilds like cron.py. Uses its own database in
+# a temporary directory, pass --baseline to leave SQLite at its defaults.
+
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+DATABASE = os.path.join(tempfile.gettempdir(), 'quickscout-contention.db')
+SETTINGS = os.path.join(tempfile.gettempdir(), 'quickscout-contention.cfg')
+# quickscout reads this when it's imported, so it has to be set first
+os.environ['QUICKSCOUT_SETTINGS'] = SETTINGS
+
+POSITIONS = ['red1', 'red2', 'red3', 'blue1', 'blue2', 'blue3']
+
+
+def write_settings(baseline):
+    with open(SETTINGS, 'w') as f:
+        f.write('SQLALCHEMY_DATABASE_URI = %r\n' % ('sqlite:///' + DATABASE))
+        f.write('SECRET_KEY = %r\n' % 'contention')
+        f.write('SQLITE_TUNING = %r\n' % (not baseline))
+
+
+def setup(matches):
+    from synthetic import event_groups
+    from quickscout import app, db, models, rebuild_match_reports
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(DATABASE + suffix):
+            os.remove(DATABASE + suffix)
+    with app.app_context():
+        db.create_all()
+        users = [models.User(name='scouter%s' % i) for i in range(len(POSITIONS))]
+        db.session.add_all(users)
+        db.session.flush()
+        db.session.add(models.ScouterPosition(**dict((pos, user.id) for pos, user in zip(POSITIONS, users))))
+        db.session.add_all(models.Team(id=team_id, name='Team %s' % team_id) for team_id in range(1000, 1060))
+        events = []
+        for match_id, position, result, match_events in event_groups(matches=matches):
+            if position == 'red1':
+                # Every team plays every tenth match
+                match = models.Match(id=match_id, **dict(
+                    (pos, 1000 + (match_id * 6 + i) % 60) for i, pos in enumerate(POSITIONS)))
+                db.session.add(match)
+                db.session.add(models.MatchResult(id=match_id, gamedata=result.gamedata))
+            events.extend({
+                'match': match_id, 'team': match.__getattribute__(position),
+                'action': event.action, 'time': event.time, 'mode': event.mode,
+            } for event in match_events)
+        db.session.flush()
+        db.session.execute(models.MatchEvent.__table__.insert(), events)
+        db.session.commit()
+        rebuild_match_reports(full=True)
+
+
+def scouter(index, matches, submissions, queue):
+    """A gunicorn worker, with one scouter submitting as fast as it can"""
+    from synthetic import match_events
+    from quickscout import app, stats
+
+    rng = random.Random(index)
+    client = app.test_client()
+    client.post('/login', data={'name': 'scouter%s' % index, 'password': ''})
+    latencies = []
+    errors = 0
+    for _ in range(submissions):
+        match_id = rng.randint(1, matches)
+        events = [event._asdict() for event in match_events(rng, POSITIONS[index])]
+        start = time.perf_counter()
+        resp = client.post('/api/match_event/%s' % match_id,
+                           json={'events': events, 'comments': '', 'drive_comments': ''})
+        latencies.append(time.perf_counter() - start)
+        if resp.status_code != 200:
+            errors += 1
+    queue.put(('web', latencies, errors, dict(stats.counters)))
+
+
+def rebuilder(stop, queue):
+    """cron.py, rebuilding everything until the scouters are done"""
+    from quickscout import app, db, rebuild_match_reports, stats, storage
+
+    storage.set_role('cron')
+    rebuilds = 0
+    errors = 0
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                rebuild_match_reports(full=True)
+                rebuilds += 1
+            except Exception as e:
+                print(e)
+                errors += 1
+                db.session.rollback()
+    queue.put(('cron', rebuilds, errors, dict(stats.counters)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Submit match events from N processes during full rebuilds')
+    parser.add_argument('--matches', type=int, default=100)
+    parser.add_argument('--scouters', type=int, default=4, choices=range(1, len(POSITIONS) + 1), metavar='N')
+    parser.add_argument('--submissions', type=int, default=50, help='per scouter')
+    parser.add_argument('--baseline', action='store_true', help='SQLite defaults: rollback journal, 5s timeout')
+    args = parser.parse_args()
+    write_settings(args.baseline)
+    setup(args.matches)
+
+    # A fresh interpreter for each process, like separate gunicorn workers
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    stop = ctx.Event()
+    cron = ctx.Process(target=rebuilder, args=(stop, queue))
+    cron.start()
+    scouters = [ctx.Process(target=scouter, args=(i, args.matches, args.submissions, queue))
+                for i in range(args.scouters)]
+    start = time.perf_counter()
+    for process in scouters:
+        process.start()
+    results = [queue.get() for _ in scouters]
+    elapsed = time.perf_counter() - start
+    stop.set()
+    results.append(queue.get())
+    for process in scouters + [cron]:
+        process.join()
+
+    latencies = sorted(latency for kind, latencies, _, _ in results if kind == 'web' for latency in latencies)
+    errors = sum(result[2] for result in results if result[0] == 'web')
+    counters = [result[3] for result in results]
+    print('%s, %s scouters x %s submissions in %.1fs' % (
+        'baseline' if args.baseline else 'tuned', args.scouters, args.submissions, elapsed))
+    print('submissions: %s ok, %s failed' % (len(latencies) - errors, errors))
+    print('latency: median %.1fms, p95 %.1fms, max %.1fms' % (
+        statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.95)] * 1000, latencies[-1] * 1000))
+    print('full rebuilds during the run: %s (%s failed)' % (results[-1][1], results[-1][2]))
+    print('lock waits: %s, %.0fms total, %.0fms max, %s "database is locked"' % (
+        sum(c.get('lock_waits', 0) for c in counters), sum(c.get('lock_wait_ms', 0) for c in counters),
+        max(c.get('lock_wait_max_ms', 0) for c in counters), sum(c.get('database_locked', 0) for c in counters)))
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
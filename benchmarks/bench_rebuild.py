@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import os
+import time
+
+from synthetic import event_groups
+
+from quickscout.reports import reduce_jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time reducing match events with 1 to N worker processes')
+    parser.add_argument('--matches', type=int, default=150)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), metavar='N')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    # Synthetic events don't have real team numbers, any unique id will do
+    jobs = [(match_id, team_id, position, result, events)
+            for team_id, (match_id, position, result, events) in enumerate(event_groups(matches=args.matches))]
+    print('%s matches, %s event lists, %s events, %s CPUs' % (
+        args.matches, len(jobs), sum(len(job[4]) for job in jobs), os.cpu_count()))
+    baseline = None
+    for workers in range(1, args.workers + 1):
+        best = None
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            for _ in reduce_jobs(iter(jobs), workers=workers):
+                pass
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        if baseline is None:
+            baseline = best
+        print('%2s workers: %7.1f ms (%.2fx)' % (workers, best * 1000, baseline / best))
+
+
+if __name__ == '__main__':
+    main()
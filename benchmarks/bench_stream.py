@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import time
+
+from legacy_stream import LegacyEventStream
+from synthetic import event_groups
+
+from sqlalchemy.exc import OperationalError
+
+from quickscout import app, models
+from quickscout.stream import EventStream, StreamResult, first_submission
+
+
+def recorded_groups():
+    """
+    Yields (match, position, result, events) for every robot that has
+    been scouted in the event database
+    """
+    results = dict((result.id, result) for result in models.MatchResult.query.all())
+    events = models.MatchEvent.query.order_by(models.MatchEvent.match, models.MatchEvent.team,
+                                              models.MatchEvent.id).all()
+    matches = dict((match.id, match) for match in models.Match.query.all())
+    group = []
+    for event in events + [None]:
+        if group and (event is None or (event.match, event.team) != (group[0].match, group[0].team)):
+            match = matches[group[0].match]
+            position = '%s%s' % (match.color(group[0].team), match.position(group[0].team))
+            yield match.id, position, results.get(match.id), first_submission(group)
+            group = []
+        if event is not None:
+            group.append(event)
+
+
+def legacy(position, result, events):
+    stream = LegacyEventStream(position, result)
+    for event in events:
+        stream.add_event(event)
+    values = dict((field, stream.__getattribute__(field)) for field in StreamResult.report_fields)
+    values['time_scoring'] = stream.time_scoring
+    return values
+
+
+def reducer(position, result, events):
+    stream = EventStream(position, result)
+    for event in events:
+        stream.add_event(event)
+    res = stream.reduce()
+    values = dict((field, res.__getattribute__(field)) for field in StreamResult.report_fields)
+    values['time_scoring'] = res.time_scoring
+    return values
+
+
+def timed(func, groups, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _, position, result, events in groups:
+            func(position, result, events)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(rounds=5):
+    with app.app_context():
+        try:
+            groups = list(recorded_groups())
+        except OperationalError:
+            # No event database
+            groups = []
+    source = 'recorded'
+    if not groups:
+        groups = list(event_groups())
+        source = 'synthetic'
+    print('%s event lists (%s), %s events' % (len(groups), source, sum(len(g[3]) for g in groups)))
+    for _, position, result, events in groups:
+        assert legacy(position, result, events) == reducer(position, result, events)
+    old = timed(legacy, groups, rounds)
+    new = timed(reducer, groups, rounds)
+    print('legacy:  %.2f ms (%.1f us per list)' % (old * 1000, old / len(groups) * 10**6))
+    print('reducer: %.2f ms (%.1f us per list)' % (new * 1000, new / len(groups) * 10**6))
+    print('speedup: %.1fx' % (old / new))
+
+
+if __name__ == '__main__':
+    main()
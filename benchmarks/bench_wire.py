@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import time
+
+from bench_stream import recorded_groups
+from synthetic import event_groups
+
+from sqlalchemy.exc import OperationalError
+
+from quickscout import app, wire
+
+
+def payloads(events):
+    # Upload bodies the way match_scout.js builds them, minus the comments
+    as_json = json.dumps({'events': events})
+    packed = json.dumps({'packed': wire.encode(events)})
+    return as_json, packed
+
+
+def timed(func, bodies, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for body in bodies:
+            func(body)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(rounds=5):
+    with app.app_context():
+        try:
+            groups = list(recorded_groups())
+        except OperationalError:
+            # No event database
+            groups = []
+    source = 'recorded'
+    if not groups:
+        groups = list(event_groups())
+        source = 'synthetic'
+    event_lists = [[{'action': event.action, 'time': event.time, 'mode': event.mode} for event in group[3]]
+                   for group in groups]
+    print('%s event lists (%s), %s events' % (len(event_lists), source, sum(len(e) for e in event_lists)))
+    json_bodies = []
+    packed_bodies = []
+    for events in event_lists:
+        as_json, packed = payloads(events)
+        assert wire.decode(json.loads(packed)['packed']) == events
+        json_bodies.append(as_json)
+        packed_bodies.append(packed)
+
+    json_size = sum(len(body) for body in json_bodies)
+    packed_size = sum(len(body) for body in packed_bodies)
+    print('json:   %s bytes (%.0f per upload)' % (json_size, json_size / len(json_bodies)))
+    print('packed: %s bytes (%.0f per upload), %.1f%% of json' % (
+        packed_size, packed_size / len(packed_bodies), packed_size / json_size * 100))
+
+    old = timed(lambda body: json.loads(body)['events'], json_bodies, rounds)
+    new = timed(lambda body: wire.decode(json.loads(body)['packed']), packed_bodies, rounds)
+    print('json decode:   %.2f ms (%.1f us per upload)' % (old * 1000, old / len(json_bodies) * 10**6))
+    print('packed decode: %.2f ms (%.1f us per upload)' % (new * 1000, new / len(packed_bodies) * 10**6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import random
+
+from quickscout import utils
+from quickscout.reports import Event, Result
+
+
+def match_events(rng, position):
+    """
+    A plausible list of button presses for one robot in one match, in the
+    order match_scout.js would record them
+    """
+    on_left = utils.is_on_left(position)
+    now = 1520000000000 + rng.randint(0, 10**6)
+    events = []
+
+    def press(action, mode, delay=None):
+        nonlocal now
+        now += delay if delay is not None else rng.randint(500, 9000)
+        events.append(Event(action, now, mode))
+
+    if rng.random() < 0.03:
+        press('noshow', 'prematch')
+    press(rng.choice(['start-far', 'start-middle', 'start-close']), 'prematch')
+    holding = rng.random() < 0.8
+    if holding:
+        press('start-with-cube', 'prematch')
+    press('mode-auton', 'auton')
+    if holding:
+        press('cube-grab' + ('1' if on_left else '5'), 'auton', 10)
+    for _ in range(rng.randint(0, 3)):
+        if holding:
+            press(rng.choice(['scale', 'switch', 'switch', 'drop']), 'auton')
+        else:
+            press('cube-grab%s' % rng.randint(1, 5), 'auton')
+        holding = not holding
+    press('mode-teleop', 'teleop')
+    for _ in range(rng.randint(0, 20)):
+        if holding:
+            press(rng.choice(['scale', 'switch', 'oswitch', 'vault', 'drop']), 'teleop')
+        else:
+            press('cube-grab%s' % rng.randint(1, 5), 'teleop')
+        holding = not holding
+        if rng.random() < 0.05:
+            press('knockoff', 'teleop')
+    if rng.random() < 0.03:
+        press('died', 'teleop')
+    press('mode-endgame', 'endgame')
+    if rng.random() < 0.6:
+        press('endplatform', 'endgame')
+        if rng.random() < 0.5:
+            press('climbend', 'endgame')
+        elif rng.random() < 0.3:
+            press('climbfail', 'endgame')
+    press('climbcarry%s' % rng.choice([0, 0, 0, 1, 2]), 'endgame')
+    return events
+
+
+def event_groups(matches=150, seed=604):
+    """
+    Yields (match, position, result, events) for every robot in a
+    synthetic event
+    """
+    rng = random.Random(seed)
+    for match_id in range(1, matches + 1):
+        result = Result(''.join(rng.choice('LR') for _ in range(3)))
+        for alliance in ['red', 'blue']:
+            for number in [1, 2, 3]:
+                position = '%s%s' % (alliance, number)
+                yield match_id, position, result, match_events(rng, position)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+
+from sqlalchemy import select
+
+from quickscout import db, models
+from quickscout.reports import event_table
+
+MatchEvent = models.MatchEvent
+MatchReport = models.MatchReport
+TbaMatchReport = models.TbaMatchReport
+Predictions = models.Predictions
+SuperScoutReport = models.SuperScoutReport
+CycleTime = models.CycleTime
+Submission = models.Submission
+
+
+def hot_queries():
+    """
+    (name, query) for the lookups that run on every page view or submission.
+    Queries that are meant to read a whole table, and ones on tables with
+    a row per scouter, aren't in here.
+    """
+    return [
+        ('match_scout: already scouted', MatchEvent.query.filter_by(match=1, team=604, action='mode-endgame')),
+        ('raw_team: events', MatchEvent.query.filter_by(match=1, team=604)),
+        ('predictions: auton start', MatchEvent.query.filter_by(match=1, action='mode-auton')),
+        ('rebuild: dirty events', select(event_table.c.match, event_table.c.team, event_table.c.action)
+            .where(event_table.c.match.in_([1, 2]))
+            .order_by(event_table.c.match, event_table.c.team, event_table.c.id)),
+        ('summary: reports before', MatchReport.query.filter(MatchReport.team.in_([604, 254]))
+            .filter(MatchReport.match < 10)),
+        ('summary: tba reports before', TbaMatchReport.query.filter(TbaMatchReport.team.in_([604, 254]))
+            .filter(TbaMatchReport.match < 10)),
+        ('summary: cycle times', CycleTime.query.filter(CycleTime.team.in_([604, 254]))),
+        ('summary: superscout reports', SuperScoutReport.query.filter(SuperScoutReport.team.in_([604, 254]))),
+        ('create_match_report: report', MatchReport.query.filter_by(match=1, team=604)),
+        ('existing_reports: reports', MatchReport.query.filter(MatchReport.team.in_([604, 254]),
+                                                               MatchReport.match.in_([1, 2]))),
+        ('existing_reports: tba reports', TbaMatchReport.query.filter(TbaMatchReport.team.in_([604, 254]),
+                                                                      TbaMatchReport.match.in_([1, 2]))),
+        ('create_match_report: cycle times', CycleTime.query.filter_by(match=1, team=604)),
+        ('aggregates: tba report', TbaMatchReport.query.filter_by(match=1, team=604)),
+        ('predictions: mine', Predictions.query.filter_by(user=1)),
+        ('predictions: match', Predictions.query.filter_by(match=1)),
+        ('predict: my prediction', Predictions.query.filter_by(user=1, match=1)),
+        ('superscout: comments', SuperScoutReport.query.filter_by(match=1, user=1)),
+        ('duplicate submission: id', Submission.query.filter_by(submission_id='x')),
+        ('duplicate submission: latest', Submission.query.filter_by(match=1, team=604).order_by(Submission.id.desc())),
+    ]
+
+
+def query_plan(query):
+    statement = getattr(query, 'statement', query)
+    sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+
+
+def main():
+    failed = []
+    for name, query in hot_queries():
+        plan = query_plan(query)
+        # "SCAN matchevents" reads every row, "SCAN ... USING INDEX" doesn't
+        scans = [step for step in plan if step.startswith('SCAN') and 'USING' not in step]
+        print('%s %s' % ('FAIL' if scans else 'ok  ', name))
+        for step in plan:
+            print('       %s' % step)
+        if scans:
+            failed.append(name)
+    if failed:
+        print('%s queries do full table scans: %s' % (len(failed), ', '.join(failed)))
+        sys.exit(1)
+    print('No full table scans.')
+
+
+if __name__ == '__main__':
+    main()
@@ -17,6 +17,7 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import argparse
 from datetime import datetime
 import hashlib
 import json
@@ -24,7 +25,7 @@ import os
 import shutil
 import subprocess
 
-from quickscout import app, charts, db, models, tba, rebuild_match_reports
+from quickscout import app, charts, db, leaderboard, models, snapshot, storage, tba, mark_dirty, rebuild_match_reports
 from quickscout.models import Match, MatchResult, TbaMatchReport, Team, TeamRanking
 from quickscout.summary import TeamSummary
 
@@ -101,6 +102,10 @@ def import_matches(code):
                 result = MatchResult(id=info['match_number'])
             else:
                 print('Updating result for {match_number}...'.format(**info))
+            if result.gamedata != info['score_breakdown']['blue']['tba_gameData']:
+                # Changes how auton actions get classified
+                mark_dirty((info['match_number'], team_id)
+                           for team_id in match.teams()['red'] + match.teams()['blue'])
             # We could import more stuff if we cared about it?
             result.red_score = info['score_breakdown']['red']['totalPoints']
             result.blue_score = info['score_breakdown']['blue']['totalPoints']
@@ -120,7 +125,11 @@ def import_matches(code):
                     if tba_report is None:
                         tba_report = TbaMatchReport(match=info['match_number'], team=team_id)
                     auto_key = 'autoRobot%s' % match.position(team_id)
-                    tba_report.auton_cross = info['score_breakdown'][alliance][auto_key] == 'AutoRun'
+                    auton_cross = info['score_breakdown'][alliance][auto_key] == 'AutoRun'
+                    if tba_report.auton_cross != auton_cross:
+                        # Team aggregates need to pick it up
+                        mark_dirty([(info['match_number'], team_id)])
+                    tba_report.auton_cross = auton_cross
                     tba_report.red_card = 'frc%s' % team_id in info['alliances'][alliance]['dq_team_keys']
                     db.session.add(tba_report)
     db.session.commit()
@@ -147,12 +156,13 @@ def import_rankings(code):
 def generate_histograms():
     print('Generating histograms...')
     teams = models.Team.query.all()
+    summaries = TeamSummary.from_team_ids(team.id for team in teams)
     for team in teams:
+        summary = summaries[team.id]
         for mode, action in charts():
             fname = '%s_%s_%s.svg' % (team.id, action, mode)
             print(fname)
             action = action.replace('-', '_')
-            summary = TeamSummary.from_team_id(team.id)
             svg = summary.histogram(action, mode)
             with open(os.path.join(app.config['HISTOGRAMS'], fname), 'wb') as f:
                 f.write(svg)
@@ -207,17 +217,30 @@ def thumbnail():
             ])
 
 
-def main():
+def main(full=False, workers=1):
+    storage.set_role('cron')
     code = app.config['EVENT_ID']
     print('Importing {}:'.format(code))
     import_team_list(code)
     import_matches(code)
     import_rankings(code)
-    rebuild_match_reports()
+    leaderboard.update()
+    db.session.commit()
+    rebuild_match_reports(full=full, workers=workers)
     generate_histograms()
+    if app.config['SNAPSHOT_DATABASE']:
+        snapshot.publish()
+    # Get everything out of the write-ahead log, so the backup copy has it
+    storage.checkpoint('TRUNCATE')
     backup()
     thumbnail()
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Import data from TBA and rebuild match reports')
+    parser.add_argument('--full', action='store_true',
+                        help='Rebuild every match report, not just the ones that changed')
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help='Number of processes to reduce match events with')
+    args = parser.parse_args()
+    main(full=args.full, workers=args.workers)
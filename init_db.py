@@ -17,7 +17,7 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from quickscout import app, db
+from quickscout import app, cache, db
 from quickscout import models
 
 
@@ -33,6 +33,8 @@ def main():
         print('Initializing scouterpositions table')
         db.session.add(models.ScouterPosition())
     db.session.commit()
+    # Versions start over with a new database
+    cache.clear()
     print('Initialized database.')
 
 
@@ -62,7 +62,6 @@ def main(debug_print=True):
             return False
         return random.random() < prob_buddy_climb
 
-    summaries = {}
     ranking_points = defaultdict(int)
     for match_id, result in results.items():
         match = models.Match.query.get(match_id)
@@ -71,8 +70,7 @@ def main(debug_print=True):
         for team_id in match.teams()['blue']:
             ranking_points[team_id] += result.blue_rp
 
-    for team in models.Team.query.all():
-        summaries[team.id] = TeamSummary.from_team_id(team.id)
+    summaries = TeamSummary.from_team_ids(team.id for team in models.Team.query.all())
     for i in range(samples):
         if i % 1000 == 0:
             print('Iteration %s...' % (i+1))
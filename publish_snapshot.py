@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import time
+
+from quickscout import app, snapshot
+
+
+def main(interval=None):
+    if not app.config['SNAPSHOT_DATABASE']:
+        print('SNAPSHOT_DATABASE isn\'t set, nothing to do.')
+        return
+    while True:
+        snapshot.publish()
+        if interval is None:
+            break
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Publish a read-only snapshot of the database for strategy pages')
+    parser.add_argument('--interval', type=int, metavar='SECONDS',
+                        help='Keep publishing a new snapshot this often')
+    args = parser.parse_args()
+    main(interval=args.interval)
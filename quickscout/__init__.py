@@ -18,12 +18,14 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 from collections import defaultdict, OrderedDict
-from flask import Flask, jsonify, make_response, redirect, render_template, request, send_from_directory, url_for
+from flask import Flask, jsonify, make_response, redirect, render_template, request, send_from_directory, \
+    session, url_for
 from flask_bootstrap import Bootstrap
 from flask_login import LoginManager, UserMixin, current_user, login_user, logout_user, login_required
 from flask_sqlalchemy import SQLAlchemy
+from markupsafe import Markup
+from sqlalchemy.exc import IntegrityError
 import os
-import statistics
 import time
 
 app = Flask(__name__)
@@ -41,14 +43,22 @@ app.config['THUMBS'] = os.path.join(os.path.dirname(os.path.dirname(__file__)),
 app.config['HISTOGRAMS'] = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'histogram')
 app.config['ADMINS'] = [] # Can control status of other scouters
 app.config['SCOUTERS'] = []
+# Seconds a logged in user's name and flags are trusted before checking them again
+app.config['IDENTITY_TTL'] = 60
+# Settings file that overrides the above, e.g. for benchmarks
+app.config.from_envvar('QUICKSCOUT_SETTINGS', silent=True)
 
-db = SQLAlchemy(app)
+from . import snapshot  # noqa
+db = SQLAlchemy(app, session_options={'class_': snapshot.Session})
 Bootstrap(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-from . import csv_dump, models, utils  # noqa
+from . import aggregates, cache, csv_dump, directory, etags, leaderboard, models, positions, queries, ranks, stats, \
+    storage, utils, versions, wire  # noqa
+from .reports import Event, create_match_report, existing_reports, mark_dirty, rebuild_match_reports, \
+    save_cycle_times, save_events  # noqa
 from .stream import EventStream  # noqa
 from .summary import TeamSummary  # noqa
 
@@ -58,6 +68,7 @@ def inject_to_templates():
     return {
         'user_name': _user_name,
         'round': round,
+        'snapshot_as_of': snapshot.as_of,
     }
 
 
@@ -67,11 +78,11 @@ def main():
 
 
 class LoginUser(UserMixin):
-    def __init__(self, id_):
+    def __init__(self, id_, name=None, is_superscout=None, dark_theme=None):
         self.id = id_
-        self._name = None
-        self._is_superscout = None
-        self._dark_theme = None
+        self._name = name
+        self._is_superscout = is_superscout
+        self._dark_theme = dark_theme
 
     @property
     def name(self):
@@ -130,38 +141,61 @@ def login():
     return render_template('login.html', msg=msg)
 
 
+# Anything that changes what's in an identity record, including the user
+# being renamed or deleted
+versions.track(models.User, 'identities')
+versions.track(models.SuperScouters, 'identities')
+versions.track(models.DarkMode, 'identities')
+
+
+def _load_identity(user_id):
+    """What every page needs to know about the logged in user, kept in the signed session cookie"""
+    user = models.User.query.filter_by(id=user_id).first()
+    if user is None:
+        return None
+    return {
+        'id': user.id,
+        'name': user.name,
+        'superscout': models.SuperScouters.query.filter_by(user=user.id).first() is not None,
+        'dark': models.DarkMode.query.filter_by(user=user.id).first() is not None,
+        'version': versions.get('identities', primary=True),
+        'checked': time.time(),
+    }
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    user = models.User.query.filter_by(id=user_id).first()
-    if user is not None:
-        return LoginUser(user.id)
-    else:
+    identity = session.get('identity')
+    if identity is None or identity['id'] != int(user_id):
+        identity = _load_identity(user_id)
+        session['identity'] = identity
+    elif time.time() - identity['checked'] > app.config['IDENTITY_TTL']:
+        # Someone else might have promoted them, or deleted them
+        if versions.get('identities', primary=True) != identity['version']:
+            identity = _load_identity(user_id)
+        else:
+            identity['checked'] = time.time()
+        session['identity'] = identity
+    if identity is None:
         return None
+    return LoginUser(identity['id'], name=identity['name'], is_superscout=identity['superscout'],
+                     dark_theme=identity['dark'])
 
 
 @app.route('/logout')
 @login_required
 def logout():
     # Un-assign from position if any
-    position = models.ScouterPosition.query.first()
-    pos = position.get_position(current_user.id)
-    if pos:
-        position.__setattr__(pos, None)
-        db.session.add(position)
-        db.session.commit()
+    positions.release(current_user.id)
     logout_user()
+    session.pop('identity', None)
     return redirect(url_for('main'))
 
 
 @app.route('/release')
 @login_required
 def release():
-    position = models.ScouterPosition.query.first()
-    pos = position.get_position(current_user.id)
-    if pos:
-        position.__setattr__(pos, None)
-        db.session.add(position)
-        db.session.commit()
+    positions.release(current_user.id)
     return redirect(url_for('main'))
 
 
@@ -174,6 +208,7 @@ def toggle_dark():
     else:
         db.session.add(models.DarkMode(user=current_user.id))
     db.session.commit()
+    session.pop('identity', None)
     return redirect(url_for('main'))
 
 
@@ -186,10 +221,12 @@ def team():
 
 @app.route('/team/<team_id>')
 @login_required
+@snapshot.use_snapshot
+@etags.conditional
 def team_team(team_id):
     team = models.Team.query.filter_by(id=team_id).first_or_404()
     pit_report = models.PitReport.query.filter_by(team=team_id).first()
-    summary = TeamSummary.from_team_id(team_id)
+    summary = TeamSummary.shared([team_id])[team_id]
     return render_template('team_team.html', team=team, pit_report=pit_report, summary=summary, charts=charts())
 
 
@@ -231,6 +268,14 @@ def batch_upload():
     return render_template('batch_upload.html', teams=teams, include_tba=False)
 
 
+@app.route('/sw.js')
+def service_worker():
+    # Served from the root so it can handle every page, not just /static/
+    response = send_from_directory(app.static_folder, 'sw.js')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @app.route('/histogram/<team_id>_<action>_<mode>.svg')
 @login_required
 def histogram_chart(team_id, action, mode):
@@ -284,19 +329,13 @@ def pit_team(team_id):
 _is_left_red = utils.is_left_red
 
 
-def _user_name(user_id):
-    if user_id:
-        return models.User.query.filter_by(id=user_id).first().name
-    else:
-        return ''
+_user_name = directory.user_name
 
 
 def _get_position(user_id=None):
     if user_id is None:
         user_id = current_user.id
-    position = models.ScouterPosition.query.first()
-    assert position is not None
-    return position.get_position(user_id)
+    return positions.position_of(user_id)
 
 
 @app.route('/match')
@@ -305,23 +344,22 @@ def match():
     mode = request.args.get('mode', 'role')
     filter_ = request.args.get('filter')
     matches = sorted(models.Match.query.all(), key=lambda x: x.id)
-    position = models.ScouterPosition.query.first()
-    assert position is not None
+    position = positions.current()
     real_position = {}
     if _is_left_red():
-        real_position['left1'] = _user_name(position.red1)
-        real_position['left2'] = _user_name(position.red2)
-        real_position['left3'] = _user_name(position.red3)
-        real_position['right1'] = _user_name(position.blue1)
-        real_position['right2'] = _user_name(position.blue2)
-        real_position['right3'] = _user_name(position.blue3)
+        real_position['left1'] = _user_name(position['red1'])
+        real_position['left2'] = _user_name(position['red2'])
+        real_position['left3'] = _user_name(position['red3'])
+        real_position['right1'] = _user_name(position['blue1'])
+        real_position['right2'] = _user_name(position['blue2'])
+        real_position['right3'] = _user_name(position['blue3'])
     else:
-        real_position['left1'] = _user_name(position.blue1)
-        real_position['left2'] = _user_name(position.blue2)
-        real_position['left3'] = _user_name(position.blue3)
-        real_position['right1'] = _user_name(position.red1)
-        real_position['right2'] = _user_name(position.red2)
-        real_position['right3'] = _user_name(position.red3)
+        real_position['left1'] = _user_name(position['blue1'])
+        real_position['left2'] = _user_name(position['blue2'])
+        real_position['left3'] = _user_name(position['blue3'])
+        real_position['right1'] = _user_name(position['red1'])
+        real_position['right2'] = _user_name(position['red2'])
+        real_position['right3'] = _user_name(position['red3'])
 
     can_claim = _get_position() is None
     show_position = True
@@ -378,39 +416,22 @@ def _left_right_colors():
 @app.route('/match/admin')
 @login_required
 def match_admin():
-    position = models.ScouterPosition.query.first()
-    assert position is not None
+    position = positions.current()
     real_position = {}
     if _is_left_red():
-        real_position['left1'] = _user_name(position.red1)
-        real_position['left2'] = _user_name(position.red2)
-        real_position['left3'] = _user_name(position.red3)
-        real_position['right1'] = _user_name(position.blue1)
-        real_position['right2'] = _user_name(position.blue2)
-        real_position['right3'] = _user_name(position.blue3)
+        real_position['left1'] = _user_name(position['red1'])
+        real_position['left2'] = _user_name(position['red2'])
+        real_position['left3'] = _user_name(position['red3'])
+        real_position['right1'] = _user_name(position['blue1'])
+        real_position['right2'] = _user_name(position['blue2'])
+        real_position['right3'] = _user_name(position['blue3'])
     else:
-        real_position['left1'] = _user_name(position.blue1)
-        real_position['left2'] = _user_name(position.blue2)
-        real_position['left3'] = _user_name(position.blue3)
-        real_position['right1'] = _user_name(position.red1)
-        real_position['right2'] = _user_name(position.red2)
-        real_position['right3'] = _user_name(position.red3)
-
-    scouters = defaultdict(int)
-    # Populate everyone at zero
-    for user in models.User.query.all():
-        scouters[user.id] = 0
-    reports = models.MatchReport.query.all()
-    for report in reports:
-        scouters[report.user] += 1
-    super_reports = models.SuperScoutReport.query.all()
-    # Count number of matches scouted by super scouters, but
-    # we need to deduplicate the reports for matches, use a set for that
-    super_counts = defaultdict(set)
-    for super_report in super_reports:
-        super_counts[super_report.user].add(super_report.match)
-    for user_id, super_matches in super_counts.items():
-        scouters[user_id] += len(super_matches)
+        real_position['left1'] = _user_name(position['blue1'])
+        real_position['left2'] = _user_name(position['blue2'])
+        real_position['left3'] = _user_name(position['blue3'])
+        real_position['right1'] = _user_name(position['red1'])
+        real_position['right2'] = _user_name(position['red2'])
+        real_position['right3'] = _user_name(position['red3'])
 
     super_scouters = [scouter.user
                       for scouter in models.SuperScouters.query.all()]
@@ -420,7 +441,7 @@ def match_admin():
         position=real_position,
         # Want sort by number of matches, then by name if tied. So sort
         # ascending, but make the number negative so bigger sorts first
-        scouters=sorted(scouters.items(), key=lambda x: (-x[1], _user_name(x[0]))),
+        scouters=sorted(queries.scouted_counts(), key=lambda x: (-x[1], _user_name(x[0]))),
         super_scouters=super_scouters,
         **_left_right_colors(),
     )
@@ -449,7 +470,10 @@ def match_scout(match_id):
         exists=exists,
         match_info={
             'match': match.id,
+            'position': position,
             'on_left': on_left,
+            'user': current_user.id,
+            'wire': wire.dictionary(),
         },
         **_left_right_colors(),
     )
@@ -519,6 +543,8 @@ def team_compare():
 
 @app.route('/match/<match_id>/info')
 @login_required
+@snapshot.use_snapshot
+@etags.conditional
 def match_info(match_id):
     if match_id == '0':
         match_id = 0
@@ -526,162 +552,134 @@ def match_info(match_id):
     else:
         match = models.Match.query.filter_by(id=match_id).first_or_404()
         team_ids = match.teams()['red'] + match.teams()['blue']
-    summaries = {}
-    teams = {}
-    for team_id in team_ids:
-        teams[team_id] = models.Team.query.get(team_id)
-        summaries[team_id] = TeamSummary.from_team_id(team_id)
-    colors = {}
-    for team_id in team_ids:
-        if match_id == 0:
-            colors[team_id] = 'info'
-        else:
-            colors[team_id] = 'danger' if match.color(team_id) == 'red' else 'info'
-
-    def prop(name):
-        return lambda x: x.__getattribute__(name)
-
-    def min_avg_max(label, name):
-        def builder(x):
-            return ' <span class="hidden-xs">/</span><span class="visible-xs-block"></span> '.join(
-                '%s' % x.__getattr__(attr+'_'+name) for attr in ['min', 'avg', 'max']
-            )
-        return label + ' (min/avg/max)', builder
-
-    data = OrderedDict((
-        ('General', OrderedDict((
-            ('Pit', lambda x: teams[x.team_id].pit),
-            ('Drivebase', prop('drivebase')),
-            ('Self-reported speed', prop('speed')),
-        ))),
-        ('Auton', OrderedDict((
-            min_avg_max('Baseline', 'auton_cross'),
-            min_avg_max('Scale', 'auton_scale'),
-            min_avg_max('Scale (cross)', 'auton_scale_cross'),
-            min_avg_max('Switch (center)', 'auton_switch_center'),
-            min_avg_max('Switch (same)', 'auton_switch_same'),
-            min_avg_max('Switch (cross)', 'auton_switch_cross'),
-        ))),
-        ('Teleop', OrderedDict((
-            min_avg_max('Scale', 'teleop_scale'),
-            min_avg_max('Switch', 'teleop_switch'),
-            min_avg_max('OSwitch', 'teleop_oswitch'),
-            min_avg_max('Vault', 'teleop_vault'),
-        ))),
-        ('Climb', OrderedDict((
-            min_avg_max('Platform', 'end_platform'),
-            min_avg_max('Climb', 'climb_success'),
-            min_avg_max('Carry', 'climb_carried')
-        ))),
-        ('Charts', OrderedDict((
-            ('', lambda x: ''),
-        ))),
-        ('Pictures', OrderedDict((
-            ('', lambda x: ''),
-        ))),
-    ))
 
-    return render_template(
-        'match_info.html',
-        match_id=match_id,
-        data=data,
-        summaries=summaries,
-        team_ids=team_ids,
-        colors=colors,
-        teams=teams,
-        charts=charts()
-    )
+    def render_table():
+        summaries = TeamSummary.shared(team_ids)
+        by_id = dict((team.id, team) for team in models.Team.query.filter(models.Team.id.in_(team_ids)).all())
+        teams = dict((team_id, by_id.get(int(team_id))) for team_id in team_ids)
+        colors = {}
+        for team_id in team_ids:
+            if match_id == 0:
+                colors[team_id] = 'info'
+            else:
+                colors[team_id] = 'danger' if match.color(team_id) == 'red' else 'info'
+
+        def prop(name):
+            return lambda x: x.__getattribute__(name)
+
+        def min_avg_max(label, name):
+            def builder(x):
+                return ' <span class="hidden-xs">/</span><span class="visible-xs-block"></span> '.join(
+                    '%s' % x.__getattr__(attr+'_'+name) for attr in ['min', 'avg', 'max']
+                )
+            return label + ' (min/avg/max)', builder
+
+        data = OrderedDict((
+            ('General', OrderedDict((
+                ('Pit', lambda x: teams[x.team_id].pit),
+                ('Drivebase', prop('drivebase')),
+                ('Self-reported speed', prop('speed')),
+            ))),
+            ('Auton', OrderedDict((
+                min_avg_max('Baseline', 'auton_cross'),
+                min_avg_max('Scale', 'auton_scale'),
+                min_avg_max('Scale (cross)', 'auton_scale_cross'),
+                min_avg_max('Switch (center)', 'auton_switch_center'),
+                min_avg_max('Switch (same)', 'auton_switch_same'),
+                min_avg_max('Switch (cross)', 'auton_switch_cross'),
+            ))),
+            ('Teleop', OrderedDict((
+                min_avg_max('Scale', 'teleop_scale'),
+                min_avg_max('Switch', 'teleop_switch'),
+                min_avg_max('OSwitch', 'teleop_oswitch'),
+                min_avg_max('Vault', 'teleop_vault'),
+            ))),
+            ('Climb', OrderedDict((
+                min_avg_max('Platform', 'end_platform'),
+                min_avg_max('Climb', 'climb_success'),
+                min_avg_max('Carry', 'climb_carried')
+            ))),
+            ('Charts', OrderedDict((
+                ('', lambda x: ''),
+            ))),
+            ('Pictures', OrderedDict((
+                ('', lambda x: ''),
+            ))),
+        ))
+
+        return render_template(
+            'match_info_table.html',
+            data=data,
+            summaries=summaries,
+            team_ids=team_ids,
+            colors=colors,
+            teams=teams,
+            charts=charts()
+        )
+
+    table = cache.fetch(cache.key('match_info', match_id, ','.join(str(team_id) for team_id in team_ids),
+                                  etags.data_version(), etags.pictures_version()), render_table)
+    return render_template('match_info.html', match_id=match_id, table=Markup(table))
 
 
 @app.route('/gamedata')
 @login_required
+@snapshot.use_snapshot
 def gamedata():
-    counts = defaultdict(int)
-    total = 0
-    for result in models.MatchResult.query.all():
-        counts[result.gamedata] += 1
-        total += 1
-    counts = OrderedDict(sorted(counts.items(), key=lambda x: x[1], reverse=True))
-    return render_template('gamedata.html', counts=counts, total=total)
+    counts = OrderedDict(queries.gamedata_counts())
+    return render_template('gamedata.html', counts=counts, total=sum(counts.values()))
 
 
 @app.route('/rankings')
 @app.route('/rankings/<sort_mode>')
 @login_required
+@snapshot.use_snapshot
+@etags.conditional
 def rankings(sort_mode='teleop_scale'):
     print("Sorting teams via " + sort_mode)
-    teams = models.Team.query.all()
-    data = {}
-    datapoints = [point for point in TeamSummary.data
-                  if point.startswith(('auton', 'teleop')) and not point.endswith(('drop', 'knockoff'))]
-    # Sort auto first
-    datapoints.sort(key=lambda x: (not x.startswith('auton'), TeamSummary.data.index(x)))
-    datapoints += ['time_teleop_scale', 'time_teleop_switch', 'time_teleop_oswitch', 'time_teleop_vault']
-
-    if sort_mode not in datapoints:
+    if sort_mode not in ranks.DATAPOINTS:
         sort_mode = 'teleop_scale'
 
-    def default_sort(x):
-        if sort_mode.startswith('time_'):
-            val = x[1].__getattribute__('average_'+sort_mode)[0]
-            if val == '-':
-                return 9999999999
-            else:
-                return val
-        else:
-            return x[1].__getattr__('avg_'+sort_mode)
-    sorts = {
-        # Use numerical sort, drop the %
-        'auton_cross': lambda x: int(default_sort(x)[:-1])
-    }
-
-    for team in teams:
-        data[team.id] = TeamSummary.from_team_id(team.id)
-
-    rev = not request.args.get('reverse')
-    data = OrderedDict(sorted(
-        data.items(),
-        key=sorts.get(sort_mode, default_sort),
-        reverse=rev
-    ))
-
-    team_rankings = dict((r.id, r.rank) for r in models.TeamRanking.query.all())
+    def render_table():
+        index = ranks.index()
+        return render_template(
+            'rankings_table.html',
+            teams=ranks.order(index, [(sort_mode, not request.args.get('reverse'))]),
+            values=index['values'],
+            bool_data=TeamSummary.bool_data,
+            sort_mode=sort_mode,
+            datapoints=ranks.DATAPOINTS,
+            team_rankings=index['tba_ranks'],
+            revd=request.args.get('reverse')
+        )
 
-    return render_template(
-        'rankings.html',
-        data=data,
-        sort_mode=sort_mode,
-        datapoints=datapoints,
-        team_rankings=team_rankings,
-        revd=request.args.get('reverse')
-    )
+    # Every viewer gets the same table until the data changes
+    table = cache.fetch(cache.key('rankings', sort_mode, bool(request.args.get('reverse')), etags.data_version()),
+                        render_table)
+    return render_template('rankings.html', sort_mode=sort_mode, table=Markup(table))
 
 
 @app.route('/predict_rankings')
 @login_required
+@snapshot.use_snapshot
 def predict_rankings():
     predict_rankings = models.RankingPrediction.query.all()
     predict_rankings.sort(key=lambda x: x.avg)
     team_rankings = dict((r.id, r.rank) for r in models.TeamRanking.query.all())
-    matches_left = defaultdict(int)
-    matches = models.Match.query.all()
-    match_results = set(r.id for r in models.MatchResult.query.all())
-    for match in matches:
-        if match.id not in match_results:
-            for team_id in match.teams()['red'] + match.teams()['blue']:
-                matches_left[team_id] += 1
+    matches_left = defaultdict(int, queries.matches_left())
 
     return render_template('predict_rankings.html', predict_rankings=predict_rankings, team_rankings=team_rankings, matches_left=matches_left)
 
 
 @app.route('/raw')
 @login_required
+@snapshot.use_snapshot
 def raw():
     matches = models.Match.query.all()
 
     reports = defaultdict(lambda: defaultdict(int))
-    for report in models.MatchReport.query.all():
-        reports[report.match][report.team] += 1
+    for match_id, team_id, count in queries.report_counts():
+        reports[match_id][team_id] = count
 
     return render_template('raw.html', matches=matches, reports=reports)
 
@@ -737,51 +735,43 @@ def predict_match(match_id):
 
 @app.route('/predictions')
 @login_required
+@snapshot.use_snapshot
 def predictions():
-    results = models.MatchResult.query.all()
-    users = defaultdict(int)
-    user_totals = defaultdict(int)
-    for result in results:
-        match_id = result.id
-        auton_start = [m.time for m
-                       in models.MatchEvent.query.filter_by(match=match_id, action='mode-auton').all()]
-        if not auton_start:
-            continue
-        match_start_ms = statistics.mean(auton_start)
-        match_start = round(match_start_ms/1000)
-
-        predicts = models.Predictions.query.filter_by(match=match_id).all()
-        for prediction in predicts:
-            # Give 20 grace seconds for clock skew
-            if prediction.time > (match_start + 20):
-                print('Skipping %s by %s (off by %ss)'
-                      % (match_id, _user_name(prediction.user), prediction.time - match_start))
-                # Lateeeeee
-                #continue
-            expected = result.winner() == 'red'
-            user_totals[_user_name(prediction.user)] += 1
-            if prediction.winner == expected:
-                users[_user_name(prediction.user)] += 1
-
-    # Sort
-    users = OrderedDict(sorted(users.items(), key=lambda x: x[1]/user_totals[x[0]], reverse=True))
+    # Kept up to date by cron, see leaderboard.py
+    users = OrderedDict()
+    user_totals = {}
+    for user_id, correct, total in leaderboard.standings():
+        users[_user_name(user_id)] = correct
+        user_totals[_user_name(user_id)] = total
     return render_template('predictions.html', users=users, user_totals=user_totals)
 
 
 _is_on_left = utils.is_on_left
 
 
-@app.route('/api/match_event/<match_id>', methods=('POST',))
-@login_required
-def api_match_event(match_id):
-    user_id = current_user.id
-    data = request.get_json()
-    match = models.Match.query.filter_by(id=match_id).first()
-    position = _get_position()
-    team_id = match.__getattribute__(position)
-    # Check to see if there's existing data we should overwrite
-    models.MatchEvent.query.filter_by(match=match_id, team=team_id).delete()
-    print(data)
+def _is_duplicate_submission(match_id, team_id, submission_id, content_hash):
+    """
+    Whether this submission was already saved, or has the same content as
+    the latest one saved for the robot. Each check is one indexed lookup.
+    """
+    if db.session.query(models.Submission.query.filter_by(submission_id=submission_id).exists()).scalar():
+        return True
+    if content_hash is None:
+        return False
+    # Only the latest, going back to an earlier version has to be saved
+    latest = models.Submission.query.filter_by(match=match_id, team=team_id) \
+        .order_by(models.Submission.id.desc()).first()
+    return latest is not None and latest.content_hash == content_hash
+
+
+def _submission_events(data, position):
+    """
+    The submitted events as Event tuples, with cube zones from the left
+    perspective. Raises ValueError if they're in a malformed packed format.
+    """
+    if 'packed' in data:
+        # Compact format from match_scout.js, see wire.py
+        data['events'] = wire.decode(data.pop('packed'))
     events = []
     for info in data['events']:
         if not _is_on_left(position):
@@ -796,88 +786,211 @@ def api_match_event(match_id):
             }
             if info['action'] in zone_map:
                 info['action'] = zone_map[info['action']]
-        event = models.MatchEvent(
-            user=user_id,
-            match=match_id,
+        events.append(Event(info['action'], info['time'], info['mode']))
+    return events
+
+
+def _save_submission(match, position, user_id, data, events, result, report, tba_report):
+    """
+    Overwrite a robot's events and match report with a submission, given
+    what existing_reports() found for it. Doesn't commit. Returns how long
+    the first write waited for the write lock, and the match report.
+    """
+    team_id = match.__getattribute__(position)
+    lock_wait = save_events(match.id, team_id, user_id, events)
+    report = create_match_report(match.id, team_id, position, events, data=data, user_id=user_id, result=result,
+                                 report=report, tba_report=tba_report)
+    if data.get('submission_id') is not None:
+        db.session.add(models.Submission(
+            submission_id=data['submission_id'],
+            content_hash=data.get('content_hash'),
+            match=match.id,
             team=team_id,
-            **info
-        )
-        events.append(event)
-        db.session.add(event)
-    db.session.commit()
+            user=user_id,
+        ))
+    return lock_wait, report
 
-    create_match_report(match_id, team_id, position, events, data=data, user_id=user_id)
+
+@app.route('/api/match_event/<match_id>', methods=('POST',))
+@login_required
+def api_match_event(match_id):
+    start = time.time()
+    user_id = current_user.id
+    data = request.get_json()
+    if data.get('user') is not None and data['user'] != user_id:
+        return jsonify(success=False, error='Scouted while logged in as someone else'), 403
+    submission_id = data.get('submission_id')
+    content_hash = data.get('content_hash')
+    match = models.Match.query.filter_by(id=match_id).first()
+    position = _get_position()
+    pair = (match.id, match.__getattribute__(position))
+    if submission_id is not None and _is_duplicate_submission(*pair, submission_id, content_hash):
+        # A retry of something we already saved, so just say it worked again
+        stats.incr('duplicate_submissions')
+        print('Ignoring duplicate submission %s for Q%s' % (submission_id, match_id))
+        return jsonify(success=True, duplicate=True)
+    result = models.MatchResult.query.filter_by(id=match.id).first()
+    try:
+        events = _submission_events(data, position)
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+    print(data)
+    reports, tba_reports = existing_reports([pair])
+
+    # Everything below is a single write transaction, so keep it short
+    # Overwrites any existing data
+    lock_wait, _ = _save_submission(match, position, user_id, data, events, result, reports.get(pair),
+                                    tba_reports.get(pair))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request with the same submission ID won the race
+        db.session.rollback()
+        stats.incr('duplicate_submissions')
+        return jsonify(success=True, duplicate=True)
+
+    elapsed = time.time() - start
+    stats.incr('submissions')
+    stats.incr('submission_bytes', request.content_length or 0)
+    stats.incr('submission_ms', elapsed * 1000)
+    stats.incr('submission_lock_wait_ms', lock_wait * 1000)
+    print('Saved Q%s for %s in %.1fms (%.1fms waiting for the write lock)'
+          % (match.id, match.__getattribute__(position), elapsed * 1000, lock_wait * 1000))
 
     return jsonify(success=True)
 
 
-def rebuild_match_reports():
-    print('Rebuilding match reports...')
-    matches = models.Match.query.all()
-    for match in matches:
-        result = models.MatchResult.query.filter_by(id=match.id).first()
-        for alliance in ['red', 'blue']:
-            for team_id in match.teams()[alliance]:
-                position = '%s%s' % (alliance, match.position(team_id))
-                events = models.MatchEvent.query.filter_by(match=match.id, team=team_id).all()
-                if not events:
-                    continue
-                # Stupid hack to filter out double POSTs in old, bad data
-                real_events = []
-                found_start = False
-                for event in events:
-                    if event.action == 'mode-auton':
-                        if found_start:
-                            break
-                        found_start = True
-                    real_events.append(event)
-                create_match_report(match.id, team_id, position, real_events, result=result)
-
-
-def create_match_report(match_id, team_id, position, events, data=None, user_id=None, result=None):
-    stream = EventStream(position, result)
-    for event in events:
-        stream.add_event(event)
+@app.route('/api/match_events/batch', methods=('POST',))
+@login_required
+def api_match_events_batch():
+    """
+    Several submissions at once, from a scouter that was offline for a few
+    matches. Each one has match, position, events (or packed), comments,
+    drive_comments and optionally user, submission_id and content_hash. They're
+    all saved in one transaction, and the response has a status for each
+    one in the same order.
+    """
+    start = time.time()
+    user_id = current_user.id
+    items = request.get_json()['submissions']
+    scouter_position = _get_position(user_id)
+    match_ids = set(item.get('match') for item in items)
+    matches = dict((match.id, match) for match in models.Match.query.filter(models.Match.id.in_(match_ids)))
+    results = dict((result.id, result)
+                   for result in models.MatchResult.query.filter(models.MatchResult.id.in_(match_ids)))
+
+    # Do all the checks first, so the write transaction stays short
+    statuses = []
+    to_save = []
+    submission_ids = set()
+    # (match, team) -> content hash of the last submission saved for it here
+    latest_hashes = {}
+    for item in items:
+        status = {'match': item.get('match'), 'submission_id': item.get('submission_id')}
+        statuses.append(status)
+        match = matches.get(item.get('match'))
+        position = item.get('position')
+        submission_id = item.get('submission_id')
+        if match is None:
+            status['status'] = 'unknown_match'
+            continue
+        if item.get('user') is not None and item['user'] != user_id:
+            # Scouted by someone else on this phone, keep it for them
+            status['status'] = 'wrong_user'
+            continue
+        if position is None or position != scouter_position:
+            status['status'] = 'wrong_position'
+            continue
+        pair = (match.id, match.__getattribute__(position))
+        content_hash = item.get('content_hash')
+        if submission_id is not None and (
+                submission_id in submission_ids or
+                # Earlier in this batch counts as the latest for the robot
+                (content_hash is not None and latest_hashes.get(pair) == content_hash) or
+                (pair not in latest_hashes and _is_duplicate_submission(*pair, submission_id, content_hash))):
+            stats.incr('duplicate_submissions')
+            status['status'] = 'duplicate'
+            continue
+        try:
+            events = _submission_events(item, position)
+        except (KeyError, TypeError, ValueError) as e:
+            status['status'] = 'invalid'
+            status['error'] = str(e)
+            continue
+        item.setdefault('comments', '')
+        item.setdefault('drive_comments', '')
+        submission_ids.add(submission_id)
+        latest_hashes[pair] = content_hash
+        to_save.append((match, position, item, events))
+        status['status'] = 'saved'
+
+    reports, tba_reports = existing_reports((match.id, match.__getattribute__(position))
+                                            for match, position, _, _ in to_save)
+    lock_wait = None
+    for match, position, item, events in to_save:
+        pair = (match.id, match.__getattribute__(position))
+        wait, reports[pair] = _save_submission(match, position, user_id, item, events, results.get(match.id),
+                                               reports.get(pair), tba_reports.get(pair))
+        if lock_wait is None:
+            lock_wait = wait
+    lock_wait = lock_wait or 0
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Something in here was saved by another request in the meantime,
+        # retrying will sort out which
+        db.session.rollback()
+        return jsonify(success=False, error='conflict'), 409
 
-    report = models.MatchReport.query.filter_by(match=match_id, team=team_id).first()
-    if report is None:
-        report = models.MatchReport(
-            match=match_id,
-            team=team_id
-        )
-    stream.update_report(report)
-    if user_id is not None:
-        report.user = user_id
-    if data:
-        report.comments = data['comments']
-        report.drive_comments = data['drive_comments']
-    db.session.add(report)
-    db.session.commit()
+    elapsed = time.time() - start
+    stats.incr('submissions', len(to_save))
+    stats.incr('submission_bytes', request.content_length or 0)
+    stats.incr('submission_ms', elapsed * 1000)
+    stats.incr('submission_lock_wait_ms', lock_wait * 1000)
+    print('Saved %s of %s submissions in %.1fms (%.1fms waiting for the write lock)'
+          % (len(to_save), len(items), elapsed * 1000, lock_wait * 1000))
+
+    return jsonify(success=True, results=statuses)
+
+
+@app.route('/api/stats')
+@login_required
+def api_stats():
+    # Only for the gunicorn worker that answers
+    return jsonify(pid=os.getpid(), etag_hit_rate=etags.hit_rate(), cache=cache.usage(), **stats.counters)
 
 
 @app.route('/api/position_claim/<pos>', methods=('POST',))
 @login_required
 def api_position_claim(pos):
-    position = models.ScouterPosition.query.first()
-    if position.__getattribute__(pos) is not None:
-        return jsonify(success=False)
-
-    position.__setattr__(pos, current_user.id)
-    db.session.add(position)
-    db.session.commit()
-    return jsonify(success=True)
+    return jsonify(success=positions.claim(pos, current_user.id))
 
 
 @app.route('/api/position_remove/<pos>', methods=('POST',))
 @login_required
 def api_position_remove(pos):
-    position = models.ScouterPosition.query.first()
-    position.__setattr__(pos, None)
-    db.session.add(position)
-    db.session.commit()
+    positions.remove(pos)
     return jsonify(success=True)
 
 
+@app.route('/api/positions')
+@login_required
+def api_positions():
+    """
+    Who is in which position. Pages poll this with the version they last
+    saw, and get an empty 204 back if nothing changed, which only costs
+    the one versions query.
+    """
+    version = versions.get('positions', primary=True)
+    if request.args.get('version', type=int) == version:
+        return '', 204
+    return jsonify(
+        version=version,
+        positions=dict((pos, _user_name(holder) or None) for pos, holder in positions.current().items()),
+        mine=positions.position_of(current_user.id),
+    )
+
+
 @app.route('/api/predict/<match_id>', methods=('POST',))
 @login_required
 def api_predict_match(match_id):
@@ -919,8 +1032,11 @@ def api_superscout(user_id):
 
 @app.route('/csv')
 @login_required
+@snapshot.use_snapshot
 def csv():
     resp = make_response(csv_dump.dump())
+    if snapshot.as_of() is not None:
+        resp.headers['X-Snapshot-As-Of'] = snapshot.as_of().isoformat()
     if not request.args.get('view'):
         resp.headers['Content-Disposition'] = 'attachment; filename=export.csv'
         resp.headers['Content-type'] = 'text/csv'
@@ -0,0 +1,135 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+from sqlalchemy import bindparam, func, select
+
+from . import db, models
+from .columns import row_values
+from .summary import TeamSummary
+
+table = models.TeamAggregate.__table__
+report_table = models.MatchReport.__table__
+
+
+def report_values(report, tba_report):
+    """What a single report adds to its team's totals, one int (or None) per TeamSummary.data field"""
+    return row_values(TeamSummary.data, report, tba_report,
+                      tba_fields=TeamSummary.tba_data, bool_fields=TeamSummary.bool_data)
+
+
+def add_report(report, tba_report):
+    """
+    Fold a newly created match report into its team's running totals.
+    Doesn't commit, so it ends up in the same transaction as the report.
+    """
+    _ensure_rows(report.team)
+    params = [{'b_team': report.team, 'b_field': field, 'value': val}
+              for field, val in zip(TeamSummary.data, report_values(report, tba_report))
+              if val is not None]
+    if not params:
+        return
+    # Do the math in SQL so concurrent submissions can't lose an update
+    value = bindparam('value')
+    db.session.execute(
+        table.update().where(table.c.team == bindparam('b_team')).where(table.c.field == bindparam('b_field')).values(
+            total=table.c.total + value,
+            count=table.c.count + 1,
+            min=func.min(func.coalesce(table.c.min, value), value),
+            max=func.max(func.coalesce(table.c.max, value), value),
+        ),
+        params
+    )
+
+
+def replace_report(team_id, old_values, new_values):
+    """
+    Swap an overwritten report's old values (from report_values()) for its
+    new ones in the team's totals, without reading the team's other
+    reports into Python. Where the old value might have been the min or
+    max, SQLite looks them up again from the team's reports, so the new
+    report has to be flushed first. Doesn't commit.
+    """
+    _ensure_rows(team_id)
+    for field, old, new in zip(TeamSummary.data, old_values, new_values):
+        if old == new:
+            continue
+        values = {
+            'total': table.c.total + ((new or 0) - (old or 0)),
+            'count': table.c.count + ((new is not None) - (old is not None)),
+        }
+        if old is None:
+            values['min'] = func.min(func.coalesce(table.c.min, new), new)
+            values['max'] = func.max(func.coalesce(table.c.max, new), new)
+        else:
+            column = _report_column(field)
+            values['min'] = select(func.min(column)).where(report_table.c.team == team_id).scalar_subquery()
+            values['max'] = select(func.max(column)).where(report_table.c.team == team_id).scalar_subquery()
+        db.session.execute(table.update().where(table.c.team == team_id).where(table.c.field == field).values(values))
+
+
+def _report_column(field):
+    # The same normalization as row_values(), in SQL. TBA fields never
+    # change with a resubmission, so they don't need one.
+    column = report_table.c[field]
+    if field == 'climb_carried':
+        # row_values() turns NULL into False too, and counts it
+        return func.coalesce(column, 0) != 0
+    return column
+
+
+def _ensure_rows(team_id):
+    db.session.execute(
+        table.insert().prefix_with('OR IGNORE'),
+        [{'team': team_id, 'field': field, 'total': 0, 'count': 0} for field in TeamSummary.data]
+    )
+
+
+def refresh(team_ids):
+    """
+    Recompute the totals of some teams from their match reports, e.g. when
+    a report was overwritten and its old values need to come back out.
+    Doesn't commit.
+    """
+    team_ids = set(int(team_id) for team_id in team_ids)
+    reports = models.MatchReport.query.filter(models.MatchReport.team.in_(team_ids)).all()
+    tba_reports = models.TbaMatchReport.query.filter(models.TbaMatchReport.team.in_(team_ids)).all()
+    stats = TeamSummary.columns(reports, tba_reports).stats()
+    db.session.execute(table.delete().where(table.c.team.in_(team_ids)))
+    _insert(stats)
+
+
+def rebuild():
+    """
+    Throw away all the totals and recompute them from scratch. Doesn't commit.
+    """
+    print('Rebuilding team aggregates...')
+    reports = models.MatchReport.query.all()
+    tba_reports = models.TbaMatchReport.query.all()
+    stats = TeamSummary.columns(reports, tba_reports).stats()
+    db.session.execute(table.delete())
+    _insert(stats)
+
+
+def _insert(stats):
+    rows = []
+    for team_id, fields in stats.items():
+        for field, (total, count, min_, max_) in fields.items():
+            rows.append({'team': team_id, 'field': field, 'total': total, 'count': count, 'min': min_, 'max': max_})
+    if rows:
+        db.session.execute(table.insert(), rows)
@@ -0,0 +1,157 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import pickle
+import sqlite3
+import threading
+import time
+
+from . import app, db, stats
+
+# Rendered pages and computed values, shared by every gunicorn worker
+# through a separate SQLite file so it never waits on the main database.
+# By default it lives next to the main database.
+app.config.setdefault('CACHE_DATABASE', None)
+# Least recently used entries are thrown out past this many bytes
+app.config.setdefault('CACHE_SIZE', 64 * 1024 * 1024)
+
+# Reading an entry only refreshes its last used time this often, so that
+# hits don't all turn into writes
+TOUCH_INTERVAL = 30
+
+_local = threading.local()
+
+
+def path():
+    """Where the cache file is, or None if there's nowhere sensible for it"""
+    if app.config['CACHE_DATABASE']:
+        return app.config['CACHE_DATABASE']
+    database = db.engine.url.database
+    if not database or database == ':memory:':
+        return None
+    return database + '.cache'
+
+
+def _connection():
+    target = path()
+    if target is None:
+        return None
+    cached = getattr(_local, 'connection', None)
+    if cached is not None and cached[0] == target:
+        return cached[1]
+    conn = sqlite3.connect(target, timeout=10, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # Losing the cache in a crash doesn't matter
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA mmap_size=%d' % app.config['CACHE_SIZE'])
+    conn.execute('CREATE TABLE IF NOT EXISTS entries '
+                 '(key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)')
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_entries_used ON entries (used)')
+    _local.connection = (target, conn)
+    return conn
+
+
+def key(*parts):
+    return ':'.join(str(part) for part in parts)
+
+
+def get(name, default=None):
+    return get_many([name]).get(name, default)
+
+
+def get_many(names):
+    """{key: value} for whichever of the keys are cached"""
+    conn = _connection()
+    if conn is None or not names:
+        return {}
+    names = list(names)
+    rows = []
+    # Stay under SQLite's limit on bound parameters
+    for start in range(0, len(names), 500):
+        chunk = names[start:start + 500]
+        rows.extend(conn.execute('SELECT key, value, used FROM entries WHERE key IN (%s)' % ','.join('?' * len(chunk)),
+                                 chunk))
+    stats.incr('cache_hits', len(rows))
+    stats.incr('cache_misses', len(names) - len(rows))
+    now = time.time()
+    stale = [(now, name) for name, _, used in rows if now - used > TOUCH_INTERVAL]
+    if stale:
+        conn.executemany('UPDATE entries SET used = ? WHERE key = ?', stale)
+    return dict((name, pickle.loads(value)) for name, value, _ in rows)
+
+
+def put(name, value):
+    put_many({name: value})
+
+
+def put_many(values):
+    """Store picklable values, then evict whatever doesn't fit anymore"""
+    conn = _connection()
+    if conn is None:
+        return
+    limit = app.config['CACHE_SIZE']
+    now = time.time()
+    rows = []
+    for name, value in values.items():
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) <= limit:
+            rows.append((name, data, len(data), now))
+    if not rows:
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.executemany('INSERT OR REPLACE INTO entries (key, value, size, used) VALUES (?, ?, ?, ?)', rows)
+        total = conn.execute('SELECT SUM(size) FROM entries').fetchone()[0]
+        if total > limit:
+            evicted = []
+            for old, size in conn.execute('SELECT key, size FROM entries ORDER BY used'):
+                if total <= limit:
+                    break
+                evicted.append((old,))
+                total -= size
+            conn.executemany('DELETE FROM entries WHERE key = ?', evicted)
+            stats.incr('cache_evictions', len(evicted))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def fetch(name, compute):
+    """The cached value for a key, computing and storing it on a miss"""
+    missing = object()
+    value = get(name, missing)
+    if value is missing:
+        value = compute()
+        put(name, value)
+    return value
+
+
+def clear():
+    conn = _connection()
+    if conn is not None:
+        conn.execute('DELETE FROM entries')
+
+
+def usage():
+    """How full the shared cache is, across all workers"""
+    conn = _connection()
+    if conn is None:
+        return None
+    entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+    return {'entries': entries, 'bytes': size, 'limit': app.config['CACHE_SIZE']}
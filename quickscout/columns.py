@@ -0,0 +1,99 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy
+
+
+class ReportColumns:
+    """
+    Column-oriented copy of match reports: one row per report, one column
+    per summary field. Stats for every team are computed with a few grouped
+    numpy reductions instead of walking the ORM objects once per attribute.
+    """
+
+    def __init__(self, fields, reports: list, tba_reports: list, tba_fields=(), bool_fields=()):
+        self.fields = list(fields)
+        tba = dict(((r.match, r.team), r) for r in tba_reports)
+        self.teams = numpy.zeros(len(reports), dtype=numpy.int64)
+        self.values = numpy.zeros((len(reports), len(self.fields)), dtype=numpy.int64)
+        # Whether the value was set at all, NULLs are left out of stats
+        self.present = numpy.zeros((len(reports), len(self.fields)), dtype=bool)
+        for row, report in enumerate(reports):
+            self.teams[row] = report.team
+            tba_report = tba.get((report.match, report.team))
+            for col, val in enumerate(row_values(self.fields, report, tba_report, tba_fields, bool_fields)):
+                if val is None:
+                    continue
+                self.values[row, col] = val
+                self.present[row, col] = True
+
+    def stats(self):
+        """
+        Returns {team: {field: (total, count, min, max)}}, min and max are
+        None if the team has no values for that field.
+        """
+        if not len(self.teams):
+            return {}
+        order = numpy.argsort(self.teams, kind='stable')
+        teams = self.teams[order]
+        values = self.values[order]
+        present = self.present[order]
+        team_ids, starts = numpy.unique(teams, return_index=True)
+        info = numpy.iinfo(numpy.int64)
+        counts = numpy.add.reduceat(present.astype(numpy.int64), starts, axis=0)
+        totals = numpy.add.reduceat(numpy.where(present, values, 0), starts, axis=0)
+        mins = numpy.minimum.reduceat(numpy.where(present, values, info.max), starts, axis=0)
+        maxs = numpy.maximum.reduceat(numpy.where(present, values, info.min), starts, axis=0)
+
+        stats = {}
+        for team_id, total, count, min_, max_ in zip(team_ids.tolist(), totals.tolist(), counts.tolist(),
+                                                     mins.tolist(), maxs.tolist()):
+            stats[team_id] = dict(
+                (field, (total[col], count[col], min_[col] if count[col] else None, max_[col] if count[col] else None))
+                for col, field in enumerate(self.fields)
+            )
+
+        return stats
+
+
+def row_values(fields, report, tba_report, tba_fields=(), bool_fields=()):
+    """
+    Normalized int (or None) value of each field for a single report
+    """
+    values = []
+    for field in fields:
+        if field in tba_fields:
+            if tba_report is None:
+                # Haven't imported TBA data yet?
+                values.append(None)
+                continue
+            val = tba_report.__getattribute__(field)
+        else:
+            val = report.__getattribute__(field)
+        if field == 'climb_carried':
+            # Normalize to boolean, since we just want to know if they
+            # can buddy climb
+            val = bool(val)
+        if val is None:
+            values.append(None)
+            continue
+        if field in bool_fields:
+            val = bool(val)
+        values.append(int(val))
+
+    return values
@@ -35,8 +35,9 @@ def dump():
     writer = csv.DictWriter(f, fieldnames=fieldnames)
     writer.writeheader()
 
+    summaries = TeamSummary.from_team_ids(team.id for team in teams)
     for team in teams:
-        summary = TeamSummary.from_team_id(team.id)
+        summary = summaries[team.id]
         data = {x: summary.__getattr__(x) for x in attrs}
         data['team'] = team.id
         writer.writerow(data)
@@ -0,0 +1,54 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from sqlalchemy import select
+
+from . import db, models, stats, versions
+
+table = models.User.__table__
+
+# id -> name of every user, shared by all the requests a worker serves
+_names = {}
+_version = None
+
+versions.track(models.User, 'users')
+
+
+def user_name(user_id):
+    if not user_id:
+        return ''
+    _check()
+    user_id = int(user_id)
+    if user_id not in _names:
+        # Someone was added without going through the ORM
+        _load(versions.get('users', primary=True))
+    return _names[user_id]
+
+
+def _check():
+    version = versions.get('users', primary=True)
+    if version != _version:
+        _load(version)
+
+
+def _load(version):
+    global _names, _version
+    # Never from a snapshot, this cache is shared with every other page
+    _names = dict(db.session.execute(select(table.c.id, table.c.name), bind_arguments={'bind': db.engine}).all())
+    _version = version
+    stats.incr('user_directory_loads')
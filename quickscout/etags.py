@@ -0,0 +1,101 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from functools import wraps
+from glob import glob
+import hashlib
+import os
+
+from flask import Response, make_response, request
+from flask_login import current_user
+
+from . import app, models, snapshot, stats, versions
+
+# Everything the strategy pages are built from
+for model in (models.Team, models.Match, models.MatchReport, models.TbaMatchReport, models.PitReport,
+              models.SuperScoutReport, models.MatchResult, models.TeamRanking):
+    versions.track(model, 'reports')
+
+
+def _code_version():
+    # A deploy changes the pages without changing the data
+    root = os.path.dirname(__file__)
+    paths = glob(os.path.join(root, '*.py')) + glob(os.path.join(root, 'templates', '*.html'))
+    return max(os.path.getmtime(path) for path in paths)
+
+
+_code = _code_version()
+
+
+def data_version():
+    """Changes whenever the code or the data the strategy pages show does"""
+    return '%s-%s' % (_code, versions.get('reports'))
+
+
+def pictures_version():
+    """Changes whenever a picture or thumbnail is added"""
+    return '-'.join(str(os.path.getmtime(folder)) if os.path.isdir(folder) else '0'
+                    for folder in (app.config['PICTURES'], app.config['THUMBS']))
+
+
+def etag():
+    """
+    Fingerprint of everything a strategy page shows: the data, who's
+    looking at it and which pictures have been uploaded
+    """
+    parts = (
+        data_version(),
+        pictures_version(),
+        request.full_path,
+        snapshot.as_of(),
+        current_user.id,
+        current_user.dark_theme,
+    )
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def conditional(func):
+    """
+    Answer If-None-Match with a 304 when nothing on the page could have
+    changed, before doing any of the work. Put it under @snapshot.use_snapshot
+    so the version comes from the same database as the page.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        tag = etag()
+        if tag in request.if_none_match:
+            stats.incr('etag_hits')
+            response = Response(status=304)
+        else:
+            stats.incr('etag_misses')
+            response = make_response(func(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(tag)
+        # Phones have to ask every time, but usually get a 304
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
+
+
+def hit_rate():
+    """Share of conditional pages answered with a 304, in this worker"""
+    total = stats.counters['etag_hits'] + stats.counters['etag_misses']
+    if not total:
+        return None
+    return stats.counters['etag_hits'] / total
@@ -0,0 +1,90 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from sqlalchemy import func, select
+
+from . import db, directory, models
+
+event_table = models.MatchEvent.__table__
+score_table = models.PredictionScore.__table__
+
+
+def update():
+    """
+    Score the predictions for matches that have a result and auton events
+    but haven't been counted yet, and recount any match whose winner
+    changed since. Run by cron after importing results. Doesn't commit.
+    """
+    results = dict((result.id, result) for result in models.MatchResult.query.all())
+    starts = dict((start.match, start) for start in models.MatchStart.query.all())
+    scores = dict((score.user, score) for score in models.PredictionScore.query.all())
+
+    for match_id, start in starts.items():
+        result = results.get(match_id)
+        if result is not None and start.red_won != (result.winner() == 'red'):
+            print('Winner of Q%s changed, rescoring predictions' % match_id)
+            _score(scores, match_id, start.red_won, start.time, -1)
+            start.red_won = result.winner() == 'red'
+            _score(scores, match_id, start.red_won, start.time, 1)
+
+    new = [match_id for match_id in results if match_id not in starts]
+    if not new:
+        return
+    # Scouters' clocks are close enough that the average of everyone's
+    # auton start is a good guess
+    auton_starts = db.session.execute(
+        select(event_table.c.match, func.avg(event_table.c.time))
+        .where(event_table.c.match.in_(new))
+        .where(event_table.c.action == 'mode-auton')
+        .group_by(event_table.c.match)
+    )
+    scored = 0
+    for match_id, start_ms in auton_starts:
+        start = models.MatchStart(match=match_id, time=round(start_ms / 1000),
+                                  red_won=results[match_id].winner() == 'red')
+        db.session.add(start)
+        _score(scores, match_id, start.red_won, start.time, 1)
+        scored += 1
+    print('Scored predictions for %s matches' % scored)
+
+
+def _score(scores, match_id, red_won, start, sign):
+    """Add (sign=1) or take back (sign=-1) a match's predictions, scores is {user: PredictionScore}"""
+    for prediction in models.Predictions.query.filter_by(match=match_id).all():
+        # Give 20 grace seconds for clock skew
+        if sign > 0 and prediction.time > (start + 20):
+            print('Late prediction for %s by %s (off by %ss)'
+                  % (match_id, directory.user_name(prediction.user), prediction.time - start))
+        score = scores.get(prediction.user)
+        if score is None:
+            score = models.PredictionScore(user=prediction.user, correct=0, total=0, last_match=match_id)
+            scores[prediction.user] = score
+            db.session.add(score)
+        score.total += sign
+        if prediction.winner == red_won:
+            score.correct += sign
+        score.last_match = max(score.last_match, match_id)
+
+
+def standings():
+    """[(user, correct, total)] for everyone with a correct prediction, best first"""
+    return [tuple(row) for row in db.session.execute(
+        select(score_table.c.user, score_table.c.correct, score_table.c.total)
+        .where(score_table.c.correct > 0)
+        .order_by((score_table.c.correct * 1.0 / score_table.c.total).desc(), score_table.c.user)
+    )]
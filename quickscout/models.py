@@ -205,6 +205,11 @@ class MatchEvent(db.Model):
     # fk to users.id
     user = db.Column(db.Integer, db.ForeignKey('users.id'))
 
+    __table_args__ = (
+        db.Index('ix_matchevents_match_team', 'match', 'team'),
+        db.Index('ix_matchevents_match_action', 'match', 'action'),
+    )
+
     matches = db.relationship(Match)
     teams = db.relationship(Team)
     users = db.relationship(User)
@@ -308,8 +313,13 @@ class MatchReport(db.Model):
     climb_failed = db.Column(db.Boolean)
     climb_carried = db.Column(db.Integer)
 
+    # JSON-encoded cycle times, only read by upgrade_db.py now
     time_scoring = db.Column(db.Text)
 
+    __table_args__ = (
+        db.Index('ix_matchreports_team_match', 'team', 'match'),
+    )
+
     matches = db.relationship(Match)
     teams = db.relationship(Team)
     users = db.relationship(User)
@@ -326,6 +336,10 @@ class TbaMatchReport(db.Model):
     auton_cross = db.Column(db.Boolean)
     red_card = db.Column(db.Boolean)
 
+    __table_args__ = (
+        db.Index('ix_tbamatchreports_team_match', 'team', 'match'),
+    )
+
     matches = db.relationship(Match)
     teams = db.relationship(Team)
 
@@ -340,6 +354,11 @@ class Predictions(db.Model):
     # Time prediction was submitted
     time = db.Column(db.Integer)
 
+    __table_args__ = (
+        db.Index('ix_predictions_user_match', 'user', 'match'),
+        db.Index('ix_predictions_match', 'match'),
+    )
+
     users = db.relationship(User)
     matches = db.relationship(Match)
 
@@ -352,6 +371,11 @@ class SuperScoutReport(db.Model):
     user = db.Column(db.Integer, db.ForeignKey('users.id'))
     info = db.Column(db.Text)
 
+    __table_args__ = (
+        db.Index('ix_superscoutreports_match_user', 'match', 'user'),
+        db.Index('ix_superscoutreports_team', 'team'),
+    )
+
     matches = db.relationship(Match)
     teams = db.relationship(Team)
     users = db.relationship(User)
@@ -371,3 +395,125 @@ class DarkMode(db.Model):
     user = db.Column(db.Integer, db.ForeignKey('users.id'))
 
     users = db.relationship(User)
+
+
+class DataVersion(db.Model):
+    """
+    A counter that goes up whenever some kind of data changes, so every
+    gunicorn worker can tell when what it has in memory is stale
+    """
+    __tablename__ = 'dataversions'
+    # e.g. 'users'
+    name = db.Column(db.String(20), primary_key=True)
+    version = db.Column(db.Integer)
+
+
+class TeamAggregate(db.Model):
+    __tablename__ = 'team_aggregates'
+    id = db.Column(db.Integer, primary_key=True)
+    # fk to teams.id
+    team = db.Column(db.Integer, db.ForeignKey('teams.id'))
+    # One of TeamSummary.data
+    field = db.Column(db.String(20))
+    # Running totals over every match report of the team
+    total = db.Column(db.Integer)
+    count = db.Column(db.Integer)
+    min = db.Column(db.Integer)
+    max = db.Column(db.Integer)
+
+    __table_args__ = (db.UniqueConstraint('team', 'field'),)
+
+    teams = db.relationship(Team)
+
+
+class CycleTime(db.Model):
+    __tablename__ = 'cycletimes'
+    id = db.Column(db.Integer, primary_key=True)
+    # fk to matches.id
+    match = db.Column(db.Integer, db.ForeignKey('matches.id'))
+    # fk to teams.id
+    team = db.Column(db.Integer, db.ForeignKey('teams.id'))
+    # Cube zone (1-5) the cube was grabbed from
+    zone = db.Column(db.Integer)
+    # scale, switch, oswitch, vault, drop, or scale_cross/switch_<mode> in auton
+    score = db.Column(db.String(20))
+    mode = db.Column(db.String(10))
+    # From grabbing the cube to scoring it
+    duration_ms = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.Index('ix_cycletimes_match_team', 'match', 'team'),
+        db.Index('ix_cycletimes_team_mode_score', 'team', 'mode', 'score'),
+    )
+
+    matches = db.relationship(Match)
+    teams = db.relationship(Team)
+
+
+class Submission(db.Model):
+    """
+    A match scouting submission that was saved, so retries can be
+    recognised without redoing any work
+    """
+    __tablename__ = 'submissions'
+    id = db.Column(db.Integer, primary_key=True)
+    # Generated by match_scout.js, the same for every retry
+    submission_id = db.Column(db.String(40), unique=True)
+    # Hash of the submitted events and comments, also from match_scout.js
+    content_hash = db.Column(db.String(16))
+    # fk to matches.id
+    match = db.Column(db.Integer, db.ForeignKey('matches.id'))
+    # fk to teams.id
+    team = db.Column(db.Integer, db.ForeignKey('teams.id'))
+    # fk to users.id
+    user = db.Column(db.Integer, db.ForeignKey('users.id'))
+
+    __table_args__ = (
+        db.Index('ix_submissions_match_team', 'match', 'team'),
+    )
+
+    matches = db.relationship(Match)
+    teams = db.relationship(Team)
+    users = db.relationship(User)
+
+
+class DirtyReport(db.Model):
+    __tablename__ = 'dirtyreports'
+    id = db.Column(db.Integer, primary_key=True)
+    # fk to matches.id
+    match = db.Column(db.Integer, db.ForeignKey('matches.id'))
+    # fk to teams.id
+    team = db.Column(db.Integer, db.ForeignKey('teams.id'))
+
+    __table_args__ = (db.UniqueConstraint('match', 'team'),)
+
+    matches = db.relationship(Match)
+    teams = db.relationship(Team)
+
+
+class MatchStart(db.Model):
+    """
+    When a match started, estimated once from the scouters' auton events.
+    Having a row means the match's predictions are in PredictionScore.
+    """
+    __tablename__ = 'matchstarts'
+    # fk to matches.id
+    match = db.Column(db.Integer, db.ForeignKey('matches.id'), primary_key=True)
+    # Seconds, like Predictions.time
+    time = db.Column(db.Integer)
+    # Winner the predictions were scored against, true = red
+    red_won = db.Column(db.Boolean)
+
+    matches = db.relationship(Match)
+
+
+class PredictionScore(db.Model):
+    __tablename__ = 'predictionscores'
+    # fk to users.id
+    user = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    correct = db.Column(db.Integer)
+    total = db.Column(db.Integer)
+    # Latest match that has been counted
+    last_match = db.Column(db.Integer)
+
+    users = db.relationship(User)
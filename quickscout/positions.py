@@ -0,0 +1,94 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from sqlalchemy import and_, case, or_, select
+
+from . import db, models, versions
+
+POSITIONS = ('red1', 'red2', 'red3', 'blue1', 'blue2', 'blue3')
+table = models.ScouterPosition.__table__
+
+# position -> user id of the scouter in it, shared by all the requests a
+# worker serves
+_positions = dict.fromkeys(POSITIONS)
+_version = None
+
+versions.track(models.ScouterPosition, 'positions')
+
+
+def current():
+    """{position: user id or None}, don't modify it"""
+    version = versions.get('positions', primary=True)
+    if version != _version:
+        _load(version)
+    return _positions
+
+
+def position_of(user_id):
+    for pos, holder in current().items():
+        if holder == user_id:
+            return pos
+    return None
+
+
+def claim(pos, user_id):
+    """
+    Take an open position, if the scouter doesn't already have one. It's a
+    single compare-and-set UPDATE, so out of two scouters claiming the
+    same position at once only one gets it. Returns whether it worked,
+    and commits.
+    """
+    if pos not in POSITIONS:
+        return False
+    others = [or_(table.c[other].is_(None), table.c[other] != user_id) for other in POSITIONS if other != pos]
+    result = db.session.execute(table.update().where(and_(table.c[pos].is_(None), *others)).values({pos: user_id}))
+    return _changed(result.rowcount)
+
+
+def remove(pos):
+    """Kick whoever is in a position out of it. Commits."""
+    if pos not in POSITIONS:
+        return False
+    result = db.session.execute(table.update().where(table.c[pos].isnot(None)).values({pos: None}))
+    return _changed(result.rowcount)
+
+
+def release(user_id):
+    """Take a scouter out of their position, if they have one. Commits."""
+    result = db.session.execute(
+        table.update().where(or_(*[table.c[pos] == user_id for pos in POSITIONS])).values(dict(
+            (pos, case((table.c[pos] == user_id, None), else_=table.c[pos])) for pos in POSITIONS
+        ))
+    )
+    return _changed(result.rowcount)
+
+
+def _changed(rowcount):
+    if rowcount:
+        versions.bump('positions')
+    db.session.commit()
+    return bool(rowcount)
+
+
+def _load(version):
+    global _positions, _version
+    # Never from a snapshot, this cache is shared with every other page
+    row = db.session.execute(select(*[table.c[pos] for pos in POSITIONS]), bind_arguments={'bind': db.engine}).first()
+    assert row is not None
+    _positions = dict(zip(POSITIONS, row))
+    _version = version
@@ -0,0 +1,70 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from sqlalchemy import distinct, func, select, union_all
+
+from . import db, models
+
+# Counting done by SQLite instead of loading every row, so these stay
+# cheap however much has been scouted. Everything returns plain tuples.
+
+match_table = models.Match.__table__
+report_table = models.MatchReport.__table__
+result_table = models.MatchResult.__table__
+superscout_table = models.SuperScoutReport.__table__
+user_table = models.User.__table__
+
+
+def _tuples(query):
+    return [tuple(row) for row in db.session.execute(query)]
+
+
+def report_counts():
+    """[(match, team, number of match reports)]"""
+    return _tuples(select(report_table.c.match, report_table.c.team, func.count())
+                   .group_by(report_table.c.match, report_table.c.team))
+
+
+def gamedata_counts():
+    """[(gamedata, number of matches)], most common first, then in match order"""
+    count = func.count()
+    return _tuples(select(result_table.c.gamedata, count)
+                   .group_by(result_table.c.gamedata)
+                   .order_by(count.desc(), func.min(result_table.c.id)))
+
+
+def scouted_counts():
+    """
+    [(user, matches scouted)] for every user. A superscout counts once per
+    match, however many teams it covered.
+    """
+    counts = dict((user_id, 0) for user_id, in _tuples(select(user_table.c.id)))
+    for user_id, count in _tuples(select(report_table.c.user, func.count()).group_by(report_table.c.user)):
+        counts[user_id] = counts.get(user_id, 0) + count
+    for user_id, count in _tuples(select(superscout_table.c.user, func.count(distinct(superscout_table.c.match)))
+                                  .group_by(superscout_table.c.user)):
+        counts[user_id] = counts.get(user_id, 0) + count
+    return list(counts.items())
+
+
+def matches_left():
+    """[(team, matches without a result yet)]"""
+    unplayed = select(match_table).where(match_table.c.id.not_in(select(result_table.c.id))).subquery()
+    slots = union_all(*[select(unplayed.c[pos].label('team'))
+                        for pos in ('red1', 'red2', 'red3', 'blue1', 'blue2', 'blue3')]).subquery()
+    return _tuples(select(slots.c.team, func.count()).group_by(slots.c.team))
@@ -0,0 +1,96 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from . import cache, etags, models
+from .summary import TeamSummary
+
+
+def _datapoints():
+    points = [point for point in TeamSummary.data
+              if point.startswith(('auton', 'teleop')) and not point.endswith(('drop', 'knockoff'))]
+    # Sort auto first
+    points.sort(key=lambda x: (not x.startswith('auton'), TeamSummary.data.index(x)))
+    return points + ['time_teleop_' + action for action in TeamSummary.time_zones]
+
+
+# What teams can be ranked by, in the order the rankings page shows them
+DATAPOINTS = _datapoints()
+
+
+def index():
+    """
+    Every team's value for every datapoint, and the teams in order for
+    each one. Built once per data version and shared by all the workers.
+    """
+    return cache.fetch(cache.key('ranks', etags.data_version()), build)
+
+
+def build():
+    teams = [team.id for team in models.Team.query.all()]
+    summaries = TeamSummary.from_team_ids(teams)
+    # datapoint -> {team: number}, cycle times are (mean ms or None, count)
+    values = {}
+    for point in DATAPOINTS:
+        if point.startswith('time_'):
+            action = point[len('time_teleop_'):]
+            values[point] = dict((team, summaries[team].time_average(action)) for team in teams)
+        else:
+            values[point] = dict((team, summaries[team].mean(point)) for team in teams)
+    ranks = {}
+    orders = {}
+    for point in DATAPOINTS:
+        key = _sort_key(point, values[point])
+        ascending = sorted(teams, key=key)
+        # Ties stay in team order both ways round
+        orders[point] = (ascending, sorted(teams, key=key, reverse=True))
+        # Equal values share a rank, for sorting by more than one datapoint
+        ranks[point] = {}
+        rank, previous = -1, None
+        for team in ascending:
+            if rank < 0 or key(team) != previous:
+                rank += 1
+                previous = key(team)
+            ranks[point][team] = rank
+    return {
+        'teams': teams,
+        'values': values,
+        'orders': orders,
+        'ranks': ranks,
+        'tba_ranks': dict((r.id, r.rank) for r in models.TeamRanking.query.all()),
+    }
+
+
+def _sort_key(point, values):
+    if point.startswith('time_'):
+        # No cycles at all sorts as the slowest
+        return lambda team: float('inf') if values[team][0] is None else values[team][0]
+    return values.__getitem__
+
+
+def order(index, keys):
+    """
+    Teams sorted by [(datapoint, descending), ...]. One key is just a
+    lookup, more than one compares the precomputed ranks. Slice it for
+    the top N.
+    """
+    if len(keys) == 1:
+        point, descending = keys[0]
+        return index['orders'][point][1 if descending else 0]
+    ranks = index['ranks']
+    return sorted(index['teams'], key=lambda team: tuple(-ranks[point][team] if descending else ranks[point][team]
+                                                         for point, descending in keys))
@@ -0,0 +1,314 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections import namedtuple
+from itertools import groupby, islice
+import multiprocessing
+import time
+
+from sqlalchemy import bindparam, select
+
+from . import aggregates, db, models, versions
+from .stream import EventStream, StreamResult, first_submission, reduce_events
+
+cycle_table = models.CycleTime.__table__
+dirty_table = models.DirtyReport.__table__
+event_table = models.MatchEvent.__table__
+report_table = models.MatchReport.__table__
+
+# Default for arguments the caller didn't look up
+_LOOKUP = object()
+
+# Picklable stand-ins for the ORM rows, so reducing can happen in another process
+Event = namedtuple('Event', ['action', 'time', 'mode'])
+Result = namedtuple('Result', ['gamedata'])
+
+
+def mark_dirty(pairs):
+    """
+    Queue (match, team) pairs for the next rebuild_match_reports(), e.g.
+    because a new match result changed how auton gets classified.
+    Doesn't commit.
+    """
+    rows = [{'match': match_id, 'team': team_id} for match_id, team_id in set(pairs)]
+    if rows:
+        db.session.execute(dirty_table.insert().prefix_with('OR IGNORE'), rows)
+
+
+def rebuild_match_reports(full=False, chunk_size=1000, workers=1):
+    """
+    Rebuild match reports from their events, in one transaction. Only the
+    pairs queued with mark_dirty() are rebuilt, unless full is set. With
+    more than one worker, the events are reduced in a process pool while
+    this process does all the writing.
+    """
+    matches = dict((match.id, match) for match in models.Match.query.all())
+    if full:
+        pairs = None
+        match_ids = None
+        print('Rebuilding all match reports...')
+    else:
+        pairs = set((dirty.match, dirty.team) for dirty in models.DirtyReport.query.all())
+        match_ids = set(match_id for match_id, _ in pairs)
+        print('Rebuilding %s match reports...' % len(pairs))
+    results = dict((result.id, result) for result in models.MatchResult.query.all())
+    existing = {}
+    for report_id, match_id, team_id in db.session.execute(
+            select(report_table.c.id, report_table.c.match, report_table.c.team).order_by(report_table.c.id)):
+        # If there are duplicate reports, update the same one create_match_report() would
+        existing.setdefault((match_id, team_id), report_id)
+
+    def jobs():
+        for match_id, team_id, events in event_groups(match_ids, chunk_size=chunk_size):
+            if pairs is not None and (match_id, team_id) not in pairs:
+                continue
+            match = matches.get(match_id)
+            if match is None or not match.is_playing(team_id):
+                continue
+            position = '%s%s' % (match.color(team_id), match.position(team_id))
+            result = results.get(match_id)
+            if result is not None:
+                result = Result(result.gamedata)
+            events = [Event(event.action, event.time, event.mode) for event in first_submission(events)]
+            yield match_id, team_id, position, result, events
+
+    batch = _ReportBatch()
+    rebuilt = set()
+    for match_id, team_id, values in reduce_jobs(jobs(), workers=workers, chunk_size=chunk_size):
+        batch.add(match_id, team_id, existing.get((match_id, team_id)), values)
+        rebuilt.add((match_id, team_id))
+        if len(batch) >= chunk_size:
+            batch.flush()
+    batch.flush()
+    print('Rebuilt %s match reports.' % len(rebuilt))
+    if rebuilt:
+        # Written with Core, so the ORM listeners didn't see it
+        versions.bump('reports')
+
+    if full or not db.session.query(models.TeamAggregate.query.exists()).scalar():
+        # TBA data might have changed too, or the database predates
+        # team_aggregates, so just recompute everything
+        aggregates.rebuild()
+        versions.bump('reports')
+    elif pairs:
+        aggregates.refresh(set(team_id for _, team_id in pairs))
+    if full:
+        db.session.execute(dirty_table.delete())
+    elif pairs:
+        db.session.execute(
+            dirty_table.delete().where(dirty_table.c.match == bindparam('b_match'))
+                                .where(dirty_table.c.team == bindparam('b_team')),
+            [{'b_match': match_id, 'b_team': team_id} for match_id, team_id in pairs]
+        )
+    db.session.commit()
+
+
+def event_groups(match_ids=None, chunk_size=1000):
+    """
+    Stream match events ordered by (match, team, id) with one query, and
+    yield (match, team, events) for each robot. Rows are plain tuples
+    fetched in chunks, so they never pile up in the session.
+    """
+    query = select(event_table.c.match, event_table.c.team, event_table.c.action,
+                   event_table.c.time, event_table.c.mode)
+    if match_ids is not None:
+        if not match_ids:
+            return
+        query = query.where(event_table.c.match.in_(match_ids))
+    query = query.order_by(event_table.c.match, event_table.c.team, event_table.c.id)
+    rows = db.session.execute(query.execution_options(yield_per=chunk_size))
+    for (match_id, team_id), events in groupby(rows, key=lambda row: (row.match, row.team)):
+        yield match_id, team_id, list(events)
+
+
+def reduce_jobs(jobs, workers=1, chunk_size=1000):
+    """
+    Reduce (match, team, position, result, events) jobs into
+    (match, team, StreamResult.as_dict()), in order
+    """
+    if workers <= 1:
+        for job in jobs:
+            yield _reduce_job(job)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        while True:
+            # Hand over a window at a time: it keeps memory bounded, and the
+            # jobs generator reads from the database so it has to stay in
+            # this thread instead of the pool's feeder thread
+            window = list(islice(jobs, chunk_size * workers))
+            if not window:
+                break
+            yield from pool.imap(_reduce_job, window, chunksize=max(1, len(window) // (workers * 4)))
+
+
+def _reduce_job(job):
+    match_id, team_id, position, result, events = job
+    return match_id, team_id, reduce_events(events, position, result).as_dict()
+
+
+class _ReportBatch:
+    """
+    Reduced event streams waiting to be written with executemany()
+    """
+    def __init__(self):
+        self.pairs = []
+        self.inserts = []
+        self.updates = []
+        self.cycle_times = []
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def add(self, match_id, team_id, report_id, result):
+        # result is StreamResult.as_dict()
+        values = dict((field, result[field]) for field in StreamResult.report_fields)
+        if report_id is None:
+            values.update(match=match_id, team=team_id)
+            self.inserts.append(values)
+        else:
+            values['b_id'] = report_id
+            self.updates.append(values)
+        self.pairs.append({'b_match': match_id, 'b_team': team_id})
+        self.cycle_times.extend(cycle_time_rows(match_id, team_id, result['time_scoring']))
+
+    def flush(self):
+        if self.pairs:
+            db.session.execute(
+                cycle_table.delete().where(cycle_table.c.match == bindparam('b_match'))
+                                    .where(cycle_table.c.team == bindparam('b_team')),
+                self.pairs
+            )
+        if self.updates:
+            db.session.execute(report_table.update().where(report_table.c.id == bindparam('b_id')), self.updates)
+        if self.inserts:
+            db.session.execute(report_table.insert(), self.inserts)
+        if self.cycle_times:
+            db.session.execute(cycle_table.insert(), self.cycle_times)
+        self.__init__()
+
+
+def existing_reports(pairs):
+    """
+    The match reports and TBA reports that saving some (match, team) pairs
+    will touch, as two {(match, team): report} dicts. Submissions look
+    them up before their first write, so the write transaction stays short.
+    """
+    pairs = set(pairs)
+    match_ids = set(match_id for match_id, _ in pairs)
+    team_ids = set(team_id for _, team_id in pairs)
+    reports = {}
+    for report in models.MatchReport.query.filter(models.MatchReport.team.in_(team_ids),
+                                                  models.MatchReport.match.in_(match_ids)) \
+            .order_by(models.MatchReport.id):
+        if (report.match, report.team) in pairs:
+            # If there are duplicate reports, update the first one
+            reports.setdefault((report.match, report.team), report)
+    tba_reports = dict(((tba_report.match, tba_report.team), tba_report)
+                       for tba_report in models.TbaMatchReport.query.filter(models.TbaMatchReport.team.in_(team_ids),
+                                                                            models.TbaMatchReport.match.in_(match_ids))
+                       if (tba_report.match, tba_report.team) in pairs)
+    return reports, tba_reports
+
+
+def create_match_report(match_id, team_id, position, events, data=None, user_id=None, result=None,
+                        update_aggregates=True, report=_LOOKUP, tba_report=_LOOKUP):
+    """
+    Create or update the match report from a team's events, and return it.
+    Doesn't commit, so the caller decides what's in the transaction. Pass
+    the existing report (or None) and TBA report from existing_reports()
+    to have no reads left once writing starts.
+    """
+    if report is _LOOKUP or tba_report is _LOOKUP:
+        found, tba_found = existing_reports([(match_id, team_id)])
+        report = found.get((match_id, team_id))
+        tba_report = tba_found.get((match_id, team_id))
+    stream = EventStream(position, result)
+    for event in events:
+        stream.add_event(event)
+
+    is_new = report is None
+    if is_new:
+        report = models.MatchReport(
+            match=match_id,
+            team=team_id
+        )
+    else:
+        old_values = aggregates.report_values(report, tba_report)
+    stream.update_report(report)
+    if user_id is not None:
+        report.user = user_id
+    if data:
+        report.comments = data['comments']
+        report.drive_comments = data['drive_comments']
+    db.session.add(report)
+    db.session.execute(cycle_table.delete().where(cycle_table.c.match == match_id).where(cycle_table.c.team == team_id))
+    save_cycle_times(match_id, team_id, stream.time_scoring)
+    # Cycle times are written with Core, and the report itself might not
+    # have changed, so the ORM listeners can't be relied on
+    versions.bump('reports')
+    if update_aggregates:
+        if is_new:
+            aggregates.add_report(report, tba_report)
+        else:
+            # Only the difference from the old values goes into the totals
+            db.session.flush()
+            aggregates.replace_report(team_id, old_values, aggregates.report_values(report, tba_report))
+    return report
+
+
+def save_events(match_id, team_id, user_id, events):
+    """
+    Replace a robot's match events using executemany. Doesn't commit.
+
+    Returns how long the first write took, which is nearly all time spent
+    waiting for SQLite's write lock.
+    """
+    start = time.time()
+    db.session.execute(event_table.delete().where(event_table.c.match == match_id).where(event_table.c.team == team_id))
+    lock_wait = time.time() - start
+    rows = [{
+        'user': user_id,
+        'match': match_id,
+        'team': team_id,
+        'action': event.action,
+        'time': event.time,
+        'mode': event.mode,
+    } for event in events]
+    if rows:
+        db.session.execute(event_table.insert(), rows)
+    return lock_wait
+
+
+def save_cycle_times(match_id, team_id, scores):
+    """
+    Insert the grab -> score pairs from EventStream.time_scoring. Doesn't commit.
+    """
+    rows = cycle_time_rows(match_id, team_id, scores)
+    if rows:
+        db.session.execute(cycle_table.insert(), rows)
+
+
+def cycle_time_rows(match_id, team_id, scores):
+    return [{
+        'match': match_id,
+        'team': team_id,
+        'zone': int(score['zone']),
+        'score': score['score'],
+        'mode': score['mode'],
+        'duration_ms': score['time'],
+    } for score in scores]
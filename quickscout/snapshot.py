@@ -0,0 +1,131 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from datetime import datetime
+from functools import wraps
+import os
+import sqlite3
+import time
+
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session as BaseSession
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from . import app, stats
+
+# Read-only copy of the database for the strategy pages, published by
+# cron.py or ./publish_snapshot.py. Set SNAPSHOT_DATABASE to a path to
+# turn it on.
+app.config.setdefault('SNAPSHOT_DATABASE', None)
+
+# (modification time, engine) for the current snapshot file
+_engine = (None, None)
+
+
+class SnapshotConnection(sqlite3.Connection):
+    # storage.py leaves these alone
+    read_only = True
+
+
+class Session(BaseSession):
+    """
+    Sends queries to the snapshot inside views wrapped with @use_snapshot,
+    and to the primary database everywhere else
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('snapshot_engine') is not None:
+            return g.snapshot_engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def publish():
+    """
+    Copy the primary database with SQLite's online backup API, which sees
+    a single consistent version of it, then swap the copy into place.
+    Pages that are reading the old snapshot carry on undisturbed.
+    """
+    # db is created after this module is imported, for the Session class
+    from . import db
+
+    target = app.config['SNAPSHOT_DATABASE']
+    tmp = target + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    start = time.time()
+    source = sqlite3.connect(db.engine.url.database)
+    dest = sqlite3.connect(tmp)
+    try:
+        source.backup(dest)
+        # Readers open it immutable, which doesn't work with a WAL
+        dest.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        dest.close()
+        source.close()
+    # The modification time is what the pages show as "as of"
+    os.utime(tmp, (start, start))
+    os.replace(tmp, target)
+    stats.incr('snapshots')
+    print('Published snapshot to %s in %.1fms' % (target, (time.time() - start) * 1000))
+
+
+def engine():
+    """
+    Engine for the current snapshot, or None if there isn't one. A new
+    engine is made whenever a new snapshot has been published.
+    """
+    global _engine
+    path = app.config['SNAPSHOT_DATABASE']
+    if not path:
+        return None
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _engine[0] != mtime:
+        if _engine[1] is not None:
+            _engine[1].dispose()
+
+        def connect():
+            # Nothing writes to this file once it's in place, so SQLite can
+            # skip locking entirely
+            return sqlite3.connect('file:%s?immutable=1' % path, uri=True, check_same_thread=False,
+                                   factory=SnapshotConnection)
+        _engine = (mtime, create_engine('sqlite://', creator=connect, poolclass=QueuePool))
+    return _engine[1]
+
+
+def use_snapshot(func):
+    """
+    Serve a read-only view from the snapshot, when there is one. Put it
+    under @login_required, so logging in still uses the primary database.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        snapshot = engine()
+        if snapshot is not None:
+            g.snapshot_engine = snapshot
+            g.snapshot_as_of = datetime.fromtimestamp(_engine[0])
+            stats.incr('snapshot_views')
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def as_of():
+    """When the snapshot this request is reading from was taken"""
+    return g.get('snapshot_as_of')
@@ -14,4 +14,7 @@ $(function() {
             window.location.reload();
         });
     });
+    PositionButtons.watch('Claim', function(name, mine) {
+        return mine !== null || name !== null;
+    });
 });
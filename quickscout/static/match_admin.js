@@ -14,6 +14,9 @@ $(function() {
             window.location.reload();
         });
     });
+    PositionButtons.watch('Open', function(name) {
+        return name === null;
+    });
     $('.qs-promote[data-id]').click(function(e) {
         e.preventDefault();
         var $elem = $(this);
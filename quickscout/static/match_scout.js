@@ -126,13 +126,62 @@ $(function() {
         var popped = events.pop();
         console.log('Undid ' + JSON.stringify(popped));
     });
-    $('#qs-everything').on('click', '.qs-submit', function(e) {
-        var data = {
-            comments: $('#comments').val(),
-            drive_comments: $('#drive_comments').val(),
-            events: events,
+    // 32-bit FNV-1a, good enough to spot a resubmission of the same content
+    function hash(str) {
+        var h = 0x811c9dc5;
+        for (var i = 0; i < str.length; i++) {
+            h ^= str.charCodeAt(i);
+            h = Math.imul(h, 0x01000193);
         }
-        $('.qs-submit').text('Submitting...');
+        return ('0000000' + (h >>> 0).toString(16)).slice(-8);
+    }
+    // Compact upload format, see quickscout/wire.py. Returns null if
+    // something isn't in the dictionaries, so the JSON gets sent instead.
+    function pack(events) {
+        var wire = match_info.wire;
+        var bytes = [];
+        function varint(n) {
+            // Times don't fit in 32 bits, so no bitwise operators here
+            while (n > 127) {
+                bytes.push((n % 128) + 128);
+                n = Math.floor(n / 128);
+            }
+            bytes.push(n);
+        }
+        var base = events.length ? events[0].time : 0;
+        varint(wire.version);
+        varint(base);
+        var mode = null;
+        var last = base;
+        for (var i = 0; i < events.length; i++) {
+            var event = events[i];
+            if (event.mode !== mode) {
+                mode = event.mode;
+                if (wire.modes.indexOf(mode) === -1) {
+                    return null;
+                }
+                varint(0);
+                varint(wire.modes.indexOf(mode));
+            }
+            var action = wire.actions.indexOf(event.action);
+            if (action === -1) {
+                return null;
+            }
+            var delta = event.time - last;
+            last = event.time;
+            varint(action + 1);
+            varint(delta >= 0 ? delta * 2 : -delta * 2 - 1);
+        }
+        return btoa(String.fromCharCode.apply(null, bytes));
+    }
+    function next_match(msg) {
+        $('.qs-submit').text(msg);
+        setTimeout( function() {
+            window.location.href = '/match/' + (match_info.match+1)
+        }, 2000 );
+    }
+    // For browsers without IndexedDB
+    function post(data) {
         $.ajax({
             method: 'POST',
             url: '/api/match_event/' + match_info.match,
@@ -141,14 +190,95 @@ $(function() {
             dataType: 'json',
         }).done(function(resp){
             console.log(resp);
-            $('.qs-submit').text('Submitted!');
-            setTimeout( function() {
-                window.location.href = '/match/' + (match_info.match+1)
-            }, 2000 );
+            next_match('Submitted!');
+        }).fail(function(){
+            $('.qs-submit').text('Submit failed, try again');
+        });
+    }
+    var submission = null;
+    $('#qs-everything').on('click', '.qs-submit', function(e) {
+        var data = {
+            comments: $('#comments').val(),
+            drive_comments: $('#drive_comments').val(),
+            events: events,
+        }
+        var content_hash = hash(JSON.stringify(data));
+        // Retries of the same content keep the same ID, so the server
+        // can tell it already has them
+        if (submission === null || submission.content_hash !== content_hash) {
+            submission = {
+                id: Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 10),
+                content_hash: content_hash,
+            };
+        }
+        data.submission_id = submission.id;
+        data.content_hash = submission.content_hash;
+        // Whoever was logged in when it was scouted, the upload may
+        // happen later under a different login
+        data.user = match_info.user;
+        var packed = pack(events);
+        if (packed !== null) {
+            delete data.events;
+            data.packed = packed;
+        }
+        $('.qs-submit').text('Submitting...');
+        if (!SubmissionQueue.available()) {
+            post(data);
+            return;
+        }
+        data.match = match_info.match;
+        data.position = match_info.position;
+        // Keep it on the phone first, so nothing is lost if the upload fails
+        SubmissionQueue.add(data).then(function() {
+            SubmissionQueue.drain().then(function(statuses) {
+                var status = statuses[data.submission_id];
+                if (status === 'saved' || status === 'duplicate') {
+                    next_match('Submitted!');
+                } else {
+                    $('.qs-submit').text('Not submitted: ' + status);
+                    SubmissionQueue.schedule();
+                }
+            }, function(err) {
+                console.log(err);
+                if ('serviceWorker' in navigator && 'SyncManager' in window) {
+                    navigator.serviceWorker.ready.then(function(reg) {
+                        return reg.sync.register('submissions');
+                    });
+                }
+                SubmissionQueue.schedule();
+                next_match('Saved on this phone, it will be uploaded when the network is back');
+            });
+        }, function(err) {
+            // e.g. private browsing
+            console.log(err);
+            post(data);
         });
         // TODO we might want an error handler that dumps the JSON
         // on the page so they can copy/paste it for later manual
         // entry
     });
 
+    if (SubmissionQueue.available()) {
+        // Upload anything left over from when the network was down
+        SubmissionQueue.schedule(0);
+        window.addEventListener('online', function() {
+            SubmissionQueue.schedule(Math.random() * 5000);
+        });
+    }
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register('/sw.js').then(function() {
+            return navigator.serviceWorker.ready;
+        }).then(function(reg) {
+            // Cache this page, its assets and the next few matches
+            var urls = [window.location.pathname];
+            $('script[src], link[rel=stylesheet]').each(function() {
+                urls.push($(this).attr('src') || $(this).attr('href'));
+            });
+            for (var i = 1; i <= 3; i++) {
+                urls.push('/match/' + (match_info.match + i));
+            }
+            reg.active.postMessage({precache: urls});
+        });
+    }
+
 });
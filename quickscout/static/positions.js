@@ -0,0 +1,39 @@
+// Keeps the position buttons on /match and /match/admin up to date
+// without reloading, by polling /api/positions. The server answers with an
+// empty 204 until the version changes.
+var PositionButtons = (function() {
+    var DELAY = 5000;
+
+    // empty is the text for an open position, and disabled(name, mine)
+    // says whether a button can't be clicked
+    function watch(empty, disabled) {
+        var version = null;
+        function poll() {
+            if (document.hidden) {
+                setTimeout(poll, DELAY);
+                return;
+            }
+            $.getJSON('/api/positions', version === null ? {} : {version: version}).done(function(data) {
+                if (!data) {
+                    return;
+                }
+                version = data.version;
+                $('button[data-pos]').each(function() {
+                    var $elem = $(this);
+                    var name = data.positions[$elem.data('pos')];
+                    $elem.find('.qs-pos-name').text(name || empty);
+                    $elem.prop('disabled', disabled(name, data.mine));
+                });
+            }).always(function() {
+                setTimeout(poll, DELAY);
+            });
+        }
+        if ($('button[data-pos]').length) {
+            setTimeout(poll, DELAY);
+        }
+    }
+
+    return {
+        watch: watch,
+    };
+})();
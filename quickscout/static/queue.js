@@ -0,0 +1,153 @@
+// Submissions waiting to be uploaded, kept in IndexedDB so they survive
+// reloads and bad venue Wi-Fi. Shared by match_scout.js and sw.js, and
+// drained through /api/match_events/batch.
+var SubmissionQueue = (function() {
+    var DB_NAME = 'quickscout';
+    var STORE = 'submissions';
+    // Backoff between failed uploads, in ms
+    var MIN_DELAY = 2000;
+    var MAX_DELAY = 5 * 60 * 1000;
+    // Statuses from the batch endpoint that mean the submission can go
+    var DONE = ['saved', 'duplicate', 'invalid', 'unknown_match'];
+
+    var dbPromise = null;
+    var attempts = 0;
+    var timer = null;
+    var draining = null;
+
+    function open() {
+        if (dbPromise === null) {
+            dbPromise = new Promise(function(resolve, reject) {
+                var req = indexedDB.open(DB_NAME, 1);
+                req.onupgradeneeded = function() {
+                    req.result.createObjectStore(STORE, {keyPath: 'submission_id'});
+                };
+                req.onsuccess = function() { resolve(req.result); };
+                req.onerror = function() { reject(req.error); };
+            });
+        }
+        return dbPromise;
+    }
+
+    function transaction(mode, fn) {
+        return open().then(function(db) {
+            return new Promise(function(resolve, reject) {
+                var tx = db.transaction(STORE, mode);
+                var result = fn(tx.objectStore(STORE));
+                tx.oncomplete = function() { resolve(result && result.result); };
+                tx.onerror = function() { reject(tx.error); };
+            });
+        });
+    }
+
+    function available() {
+        return typeof indexedDB !== 'undefined';
+    }
+
+    function add(submission) {
+        return transaction('readwrite', function(store) {
+            store.put(submission);
+        });
+    }
+
+    function all() {
+        return transaction('readonly', function(store) {
+            return store.getAll();
+        });
+    }
+
+    function remove(ids) {
+        return transaction('readwrite', function(store) {
+            ids.forEach(function(id) { store.delete(id); });
+        });
+    }
+
+    // Upload everything that's queued in one request. Resolves to
+    // {submission_id: status} and rejects if the upload failed.
+    function upload() {
+        return all().then(function(queued) {
+            if (!queued.length) {
+                return {};
+            }
+            return fetch('/api/match_events/batch', {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({submissions: queued}),
+            }).then(function(resp) {
+                if (!resp.ok) {
+                    throw new Error('Upload failed with HTTP ' + resp.status);
+                }
+                return resp.json();
+            }).then(function(resp) {
+                var statuses = {};
+                var done = [];
+                resp.results.forEach(function(result) {
+                    statuses[result.submission_id] = result.status;
+                    if (DONE.indexOf(result.status) !== -1) {
+                        done.push(result.submission_id);
+                    } else {
+                        console.log('Keeping queued submission', result);
+                    }
+                });
+                return remove(done).then(function() { return statuses; });
+            });
+        });
+    }
+
+    // Only one upload at a time, whoever asks for it
+    function drain() {
+        if (draining === null) {
+            draining = upload().then(function(statuses) {
+                draining = null;
+                attempts = 0;
+                return statuses;
+            }, function(err) {
+                draining = null;
+                attempts++;
+                throw err;
+            });
+        }
+        return draining;
+    }
+
+    // Exponential backoff with jitter, so phones coming back online
+    // together don't all upload at the same moment
+    function nextDelay() {
+        var delay = Math.min(MAX_DELAY, MIN_DELAY * Math.pow(2, attempts));
+        return delay / 2 + Math.random() * delay / 2;
+    }
+
+    // Try again later, after the backoff unless a delay is given
+    function schedule(delay) {
+        if (timer !== null) {
+            if (delay === undefined) {
+                return;
+            }
+            clearTimeout(timer);
+        }
+        timer = setTimeout(function() {
+            timer = null;
+            drain().then(function() {
+                return all();
+            }).then(function(queued) {
+                if (queued.length) {
+                    // Only things waiting on a position claim or on
+                    // the user who scouted them logging back in are left
+                    schedule(MAX_DELAY);
+                }
+            }, function(err) {
+                console.log(err);
+                schedule(nextDelay());
+            });
+        }, delay === undefined ? nextDelay() : delay);
+    }
+
+    return {
+        available: available,
+        add: add,
+        all: all,
+        drain: drain,
+        schedule: schedule,
+    };
+})();
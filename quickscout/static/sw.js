@@ -0,0 +1,110 @@
+// Service worker for match scouting, served as /sw.js so it covers the
+// /match/<id> pages. Static assets come from the cache and are refreshed
+// in the background, so a deploy shows up on the next page load; scouting
+// pages come from the network with the last copy as a fallback, and queued
+// submissions are uploaded by background sync where it's supported.
+importScripts('/static/queue.js');
+
+var CACHE = 'quickscout-v2';
+var PRECACHE = [
+    '/static/match_scout.js',
+    '/static/match_predict.js',
+    '/static/queue.js',
+    '/static/styles.css',
+    '/static/dark.css',
+];
+
+self.addEventListener('install', function(event) {
+    event.waitUntil(caches.open(CACHE).then(function(cache) {
+        return cache.addAll(PRECACHE);
+    }).then(function() {
+        return self.skipWaiting();
+    }));
+});
+
+self.addEventListener('activate', function(event) {
+    event.waitUntil(caches.keys().then(function(keys) {
+        return Promise.all(keys.filter(function(key) {
+            return key !== CACHE;
+        }).map(function(key) {
+            return caches.delete(key);
+        }));
+    }).then(function() {
+        return self.clients.claim();
+    }));
+});
+
+// Only keep real pages, not a redirect to the login page or similar
+function store(request, response) {
+    if (response.ok && !response.redirected) {
+        var copy = response.clone();
+        caches.open(CACHE).then(function(cache) {
+            cache.put(request, copy);
+        });
+    }
+    return response;
+}
+
+self.addEventListener('fetch', function(event) {
+    var request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    var path = new URL(request.url).pathname;
+    if (path.indexOf('/static/') === 0) {
+        var fetched = fetch(request);
+        // Keep the worker alive until the fresh copy is stored
+        event.waitUntil(fetched.then(function(response) {
+            if (response.ok) {
+                var copy = response.clone();
+                return caches.open(CACHE).then(function(cache) {
+                    return cache.put(request, copy);
+                });
+            }
+        }, function() {
+            // Offline, keep the cached copy
+        }));
+        event.respondWith(caches.match(request).then(function(cached) {
+            return cached || fetched;
+        }));
+    } else if (/^\/match\/\d+$/.test(path)) {
+        event.respondWith(fetch(request).then(function(response) {
+            return store(request, response);
+        }, function() {
+            return caches.match(request, {ignoreSearch: true}).then(function(cached) {
+                return cached || Response.error();
+            });
+        }));
+    }
+});
+
+// match_scout.js sends the page's assets and the next few matches,
+// so the scouter can keep going without a network
+self.addEventListener('message', function(event) {
+    if (!event.data || !event.data.precache) {
+        return;
+    }
+    event.waitUntil(caches.open(CACHE).then(function(cache) {
+        return Promise.all(event.data.precache.map(function(url) {
+            return cache.match(url).then(function(cached) {
+                if (cached) {
+                    // Pages get refreshed whenever they're visited online
+                    return;
+                }
+                return fetch(url, {credentials: 'same-origin'}).then(function(response) {
+                    if (response.ok && !response.redirected) {
+                        return cache.put(url, response);
+                    }
+                }, function() {
+                    // Offline, try again next page load
+                });
+            });
+        }));
+    }));
+});
+
+self.addEventListener('sync', function(event) {
+    if (event.tag === 'submissions') {
+        event.waitUntil(SubmissionQueue.drain());
+    }
+});
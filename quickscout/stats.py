@@ -0,0 +1,50 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections import defaultdict
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import app
+
+# Print how many queries each request made, on top of debug mode
+app.config.setdefault('LOG_QUERIES', False)
+
+# Counters for this process, every gunicorn worker has its own
+counters = defaultdict(int)
+
+
+def incr(name, amount=1):
+    counters[name] += amount
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    incr('queries')
+    if has_request_context():
+        g.queries = g.get('queries', 0) + 1
+
+
+@app.after_request
+def _report_queries(response):
+    incr('requests')
+    if app.debug or app.config['LOG_QUERIES']:
+        print('%s: %s queries' % (request.path, g.get('queries', 0)))
+    return response
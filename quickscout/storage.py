@@ -0,0 +1,122 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sqlite3
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from . import app, db, stats
+
+# SQLite settings for each kind of process. The web workers commit
+# scouting submissions that can't be redone, so every commit is synced,
+# and they give up on a lock soon enough that the phone can retry. cron.py
+# only writes data it can rebuild, and would rather wait than fail.
+ROLES = {
+    'web': {'busy_timeout': 10000, 'synchronous': 'FULL'},
+    'cron': {'busy_timeout': 60000, 'synchronous': 'NORMAL'},
+}
+role = 'web'
+
+_WRITES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def set_role(new_role):
+    """
+    Use another role's settings for new connections, call it before
+    touching the database
+    """
+    global role
+    if new_role not in ROLES:
+        raise ValueError('Unknown database role: %s' % new_role)
+    role = new_role
+
+
+@event.listens_for(Engine, 'connect')
+def _configure(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection) or not app.config.get('SQLITE_TUNING', True):
+        return
+    if getattr(dbapi_connection, 'read_only', False):
+        # A snapshot, see snapshot.py
+        return
+    settings = ROLES[role]
+    cursor = dbapi_connection.cursor()
+    # Readers and the writer don't block each other. This sticks to the
+    # database file, but it's cheap to check.
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA busy_timeout=%d' % settings['busy_timeout'])
+    cursor.execute('PRAGMA synchronous=%s' % settings['synchronous'])
+    cursor.close()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_write(conn, cursor, statement, parameters, context, executemany):
+    if not conn.info.get('writing') and statement.lstrip().upper().startswith(_WRITES):
+        conn.info['write_start'] = time.time()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_write(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop('write_start', None)
+    if start is not None:
+        # The first write of a transaction is what waits for the write
+        # lock, so its time is nearly all lock wait
+        conn.info['writing'] = True
+        wait_ms = (time.time() - start) * 1000
+        stats.incr('lock_waits')
+        stats.incr('lock_wait_ms', wait_ms)
+        stats.counters['lock_wait_max_ms'] = max(stats.counters['lock_wait_max_ms'], wait_ms)
+
+
+@event.listens_for(Engine, 'commit')
+@event.listens_for(Engine, 'rollback')
+def _end_transaction(conn):
+    conn.info.pop('writing', None)
+    conn.info.pop('write_start', None)
+
+
+@event.listens_for(Pool, 'checkin')
+def _checkin(dbapi_connection, connection_record):
+    # The pool rolls back anything left open without firing the above
+    connection_record.info.pop('writing', None)
+    connection_record.info.pop('write_start', None)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _count_locked(context):
+    if 'database is locked' in str(context.original_exception):
+        stats.incr('database_locked')
+
+
+def checkpoint(mode='PASSIVE'):
+    """
+    Copy the write-ahead log back into the database file. TRUNCATE waits
+    for readers to finish and then empties the log, PASSIVE copies what it
+    can without waiting. Returns (busy, frames in the log, frames copied).
+    """
+    start = time.time()
+    with db.engine.connect() as conn:
+        busy, log, checkpointed = conn.exec_driver_sql('PRAGMA wal_checkpoint(%s)' % mode).fetchone()
+    elapsed = (time.time() - start) * 1000
+    stats.incr('checkpoints')
+    stats.incr('checkpoint_ms', elapsed)
+    print('Checkpointed %s of %s WAL frames in %.1fms%s' % (
+        checkpointed, log, elapsed, ' (busy)' if busy else ''))
+    return busy, log, checkpointed
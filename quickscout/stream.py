@@ -16,255 +16,277 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from collections import defaultdict, OrderedDict
+
 from itertools import zip_longest
-import json
 
 from . import utils
 from .models import StartPosition
 
+# Scoring actions that are counted per mode, (action, mode) -> counter
+COUNTERS = {
+    ('switch', 'auton'): 'auton_switch',
+    ('scale', 'auton'): 'auton_scale',
+    ('drop', 'auton'): 'auton_drop',
+    ('switch', 'teleop'): 'teleop_switch',
+    ('scale', 'teleop'): 'teleop_scale',
+    ('oswitch', 'teleop'): 'teleop_oswitch',
+    ('vault', 'teleop'): 'teleop_vault',
+    ('drop', 'teleop'): 'teleop_drop',
+    ('knockoff', 'teleop'): 'teleop_knockoff',
+}
+# Actions that only matter if they happened at all
+FLAGS = ('died', 'noshow', 'start-far', 'start-middle', 'start-with-cube', 'endplatform',
+         'climbend', 'climbfail', 'climbcarry1', 'climbcarry2')
+SCORING_EVENTS = ('scale', 'switch', 'oswitch', 'vault', 'drop')
+CUBE_GRABS = ('cube-grab1', 'cube-grab2', 'cube-grab3', 'cube-grab4', 'cube-grab5')
+
+_COUNTER_SLOTS = dict((name, slot) for slot, name in enumerate(sorted(set(COUNTERS.values()))))
+
+
+def _build_lookup():
+    # action -> ({mode: counter slot}, is a flag, goes on the cycle time timeline)
+    lookup = {}
+    for action in set(action for action, _ in COUNTERS) | set(FLAGS) | set(SCORING_EVENTS) | set(CUBE_GRABS):
+        slots = dict((mode, _COUNTER_SLOTS[name]) for (action_, mode), name in COUNTERS.items() if action_ == action)
+        lookup[action] = (slots, action in FLAGS, action in SCORING_EVENTS or action in CUBE_GRABS)
+    return lookup
+
+
+# Anything not in here (mode changes, start-close, climbcarry0) can be skipped
+_LOOKUP = _build_lookup()
+
+
+class StreamResult:
+    """
+    Everything a match report needs from an event stream, filled in by a
+    single pass over the events
+    """
+    # Fields that are copied onto MatchReport
+    report_fields = (
+        'died', 'noshow', 'start_position', 'start_cube',
+        'auton_switch_center', 'auton_switch_same', 'auton_switch_cross',
+        'auton_scale', 'auton_scale_cross', 'auton_drop',
+        'teleop_switch', 'teleop_scale', 'teleop_oswitch', 'teleop_vault', 'teleop_drop', 'teleop_knockoff',
+        'end_platform', 'climb_success', 'climb_failed', 'climb_time', 'climb_carried',
+    )
+    __slots__ = report_fields + ('switch_auton_mode', 'crossing_scale_in_auton', 'time_scoring')
+
+    def as_dict(self):
+        return dict((field, self.__getattribute__(field)) for field in self.__slots__)
+
+
+def reduce_events(events, position, result=None):
+    """
+    Walk the events once and work out every match report field, plus the
+    grab -> score cycle times
+    """
+    counters = [0] * len(_COUNTER_SLOTS)
+    seen = set()
+    last_time = {}
+    # Cube grabs and scores per mode, with the order each action was first
+    # seen to break ties between events at the same time
+    timeline = {'auton': [], 'teleop': []}
+    first_seen = {}
+    for event in events:
+        action = event.action
+        kind = _LOOKUP.get(action)
+        if kind is None:
+            continue
+        slots, flag, on_timeline = kind
+        mode = event.mode
+        if slots:
+            slot = slots.get(mode)
+            if slot is not None:
+                counters[slot] += 1
+        if flag:
+            seen.add(action)
+            last_time[action] = event.time
+        if on_timeline:
+            if action not in first_seen:
+                first_seen[action] = len(first_seen)
+            if mode in timeline:
+                # Sort key, then the event itself
+                timeline[mode].append((event.time, first_seen[action], len(timeline[mode]), event))
+
+    res = StreamResult()
+    res.died = 'died' in seen
+    res.noshow = 'noshow' in seen
+    res.start_cube = 'start-with-cube' in seen
+    res.start_position = _start_position(seen, position)
+    res.crossing_scale_in_auton = _is_crossing_scale(res.start_position, result)
+    res.switch_auton_mode = _switch_auton_mode(res.start_position, result)
+
+    auton_switch = counters[_COUNTER_SLOTS['auton_switch']]
+    res.auton_switch_center = auton_switch if res.switch_auton_mode == 'center' else 0
+    res.auton_switch_same = auton_switch if res.switch_auton_mode == 'same' else 0
+    res.auton_switch_cross = auton_switch if res.switch_auton_mode == 'cross' else 0
+    auton_scale = counters[_COUNTER_SLOTS['auton_scale']]
+    res.auton_scale = 0 if res.crossing_scale_in_auton else auton_scale
+    res.auton_scale_cross = auton_scale if res.crossing_scale_in_auton else 0
+    res.auton_drop = counters[_COUNTER_SLOTS['auton_drop']]
+    res.teleop_switch = counters[_COUNTER_SLOTS['teleop_switch']]
+    res.teleop_scale = counters[_COUNTER_SLOTS['teleop_scale']]
+    res.teleop_oswitch = counters[_COUNTER_SLOTS['teleop_oswitch']]
+    res.teleop_vault = counters[_COUNTER_SLOTS['teleop_vault']]
+    res.teleop_drop = counters[_COUNTER_SLOTS['teleop_drop']]
+    res.teleop_knockoff = counters[_COUNTER_SLOTS['teleop_knockoff']]
+
+    res.end_platform = 'endplatform' in seen
+    # If they climb success and then fall or something, make sure they
+    # didn't have a failure too.
+    res.climb_success = 'climbend' in seen and 'climbfail' not in seen
+    res.climb_failed = 'climbfail' in seen
+    if not res.climb_success:
+        res.climb_time = None
+    elif 'endplatform' not in seen:
+        res.climb_time = 0
+    else:
+        res.climb_time = last_time['climbend'] - last_time['endplatform']
+    if 'climbcarry1' in seen:
+        res.climb_carried = 1
+    elif 'climbcarry2' in seen:
+        res.climb_carried = 2
+    else:  # climbcarry0
+        res.climb_carried = 0
+
+    res.time_scoring = _time_scoring(timeline, res)
+    return res
+
+
+def _start_position(seen, position):
+    if 'start-far' in seen:
+        pos = 'far'
+    elif 'start-middle' in seen:
+        pos = 'middle'
+    else:  # start-close
+        pos = 'close'
+    # Translate start location (far/middle/close) to l/m/r
+    position_map = {
+        'middle': StartPosition.middle
+    }
+    if utils.is_on_left(position):
+        # Team is on left side
+        position_map['far'] = StartPosition.left
+        position_map['close'] = StartPosition.right
+    else:
+        # Team is on right side
+        position_map['far'] = StartPosition.right
+        position_map['close'] = StartPosition.left
+
+    return position_map.get(pos)
+
+
+def _is_crossing_scale(start_position, result):
+    if result is None:
+        # If we don't have the match result, we
+        # don't know if it's crossing yet
+        return False
+    scale = {
+        'L': StartPosition.left,
+        'R': StartPosition.right
+    }[result.gamedata[1]]
+    return start_position != scale
+
+
+def _switch_auton_mode(start_position, result):
+    if start_position == StartPosition.middle:
+        return 'center'
+    if result is None:
+        # If we don't have the match result, we
+        # don't know if it's crossing yet
+        return 'center'
+    switch = {
+        'L': StartPosition.left,
+        'R': StartPosition.right
+    }[result.gamedata[0]]
+    if switch == start_position:
+        return 'same'
+    else:
+        return 'cross'
+
+
+def _time_scoring(timeline, res):
+    scores = []
+    for mode in ['auton', 'teleop']:
+        mode_timeline = [entry[-1] for entry in sorted(timeline[mode])]
+        # If the first action is scoring then ignore it since the cube is from a previous mode
+        if mode_timeline and not mode_timeline[0].action.startswith('cube-grab'):
+            mode_timeline.pop(0)
+        # The sequence should be cube-grab / scoring / cube-grab / scoring / etc.
+        for grab, score in grouper(mode_timeline, 2):
+            if score is None:
+                # They grabbed a cube and never did anything
+                # with it, maybe the match ended?
+                continue
+            if mode == 'auton' and score.action == 'scale' and res.crossing_scale_in_auton:
+                action = 'scale_cross'
+            elif mode == 'auton' and score.action == 'switch':
+                action = 'switch_' + res.switch_auton_mode
+            else:
+                action = score.action
+            data = {
+                'zone': grab.action[-1],
+                'score': action,
+                'time': score.time - grab.time,
+                'mode': score.mode,
+            }
+            int(data['zone'])
+            scores.append(data)
+
+    return scores
+
+
+def first_submission(events):
+    """
+    Stupid hack to filter out double POSTs in old, bad data: only keep
+    events up to the second time auton started
+    """
+    real_events = []
+    found_start = False
+    for event in events:
+        if event.action == 'mode-auton':
+            if found_start:
+                break
+            found_start = True
+        real_events.append(event)
+
+    return real_events
+
 
 class EventStream:
     def __init__(self, position, result=None):
-        self.events = defaultdict(list)
+        self.events = []
         self.position = position
         self.result = result
+        self._result = None
 
     def add_event(self, event):
-        self.events[event.action].append(event)
-
-    def update_report(self, report):
-        # Doesn't handle drive_comments and comments
-        report.died = self.died
-        report.noshow = self.noshow
-        report.start_cube = self.start_cube
-        report.auton_switch_center = self.auton_switch_center
-        report.auton_switch_same = self.auton_switch_same
-        report.auton_switch_cross = self.auton_switch_cross
-        report.auton_scale = self.auton_scale
-        report.auton_scale_cross = self.auton_scale_cross
-        report.auton_drop = self.auton_drop
-        report.teleop_switch = self.teleop_switch
-        report.teleop_scale = self.teleop_scale
-        report.teleop_oswitch = self.teleop_oswitch
-        report.teleop_vault = self.teleop_vault
-        report.teleop_drop = self.teleop_drop
-        report.teleop_knockoff = self.teleop_knockoff
-        report.end_platform = self.end_platform
-        report.climb_success = self.climb_success
-        report.climb_failed = self.climb_failed
-        report.climb_time = self.climb_time
-        report.climb_carried = self.climb_carried
-        report.start_position = self.start_position
-        report.time_scoring = json.dumps(self.time_scoring)
+        self.events.append(event)
+        self._result = None
 
-    @property
-    def died(self):
-        return 'died' in self.events
-
-    @property
-    def noshow(self):
-        return 'noshow' in self.events
+    def reduce(self):
+        if self._result is None:
+            self._result = reduce_events(self.events, self.position, self.result)
+        return self._result
 
-    @property
-    def start_position(self):
-        if 'start-far' in self.events:
-            pos = 'far'
-        elif 'start-middle' in self.events:
-            pos = 'middle'
-        else:  # start-close
-            pos = 'close'
-        # Translate start location (far/middle/close) to l/m/r
-        position_map = {
-            'middle': StartPosition.middle
-        }
-        if utils.is_on_left(self.position):
-            # Team is on left side
-            position_map['far'] = StartPosition.left
-            position_map['close'] = StartPosition.right
-        else:
-            # Team is on right side
-            position_map['far'] = StartPosition.right
-            position_map['close'] = StartPosition.left
-
-        return position_map.get(pos)
-
-    @property
-    def start_cube(self):
-        return 'start-with-cube' in self.events
-
-    def _filter_mode(self, gen, mode):
-        for i in gen:
-            if i.mode == mode:
-                yield i
+    def update_report(self, report):
+        # Doesn't handle drive_comments, comments and time_scoring
+        res = self.reduce()
+        for field in StreamResult.report_fields:
+            report.__setattr__(field, res.__getattribute__(field))
 
     def is_crossing_scale_in_auton(self):
-        if self.result is None:
-            # If we don't have the match result, we
-            # don't know if it's crossing yet
-            return False
-        scale = {
-            'L': StartPosition.left,
-            'R': StartPosition.right
-        }[self.result.gamedata[1]]
-        return self.start_position != scale
+        return self.reduce().crossing_scale_in_auton
 
     @property
     def _switch_auton_mode(self):
-        if self.start_position == StartPosition.middle:
-            return 'center'
-        if self.result is None:
-            # If we don't have the match result, we
-            # don't know if it's crossing yet
-            return 'center'
-        switch = {
-            'L': StartPosition.left,
-            'R': StartPosition.right
-        }[self.result.gamedata[0]]
-        if switch == self.start_position:
-            return 'same'
-        else:
-            return 'cross'
+        return self.reduce().switch_auton_mode
 
-    @property
-    def auton_switch_center(self):
-        if self._switch_auton_mode != 'center':
-            return 0
-        return len(list(self._filter_mode(self.events['switch'], 'auton')))
-
-    @property
-    def auton_switch_same(self):
-        if self._switch_auton_mode != 'same':
-            return 0
-        return len(list(self._filter_mode(self.events['switch'], 'auton')))
-
-    @property
-    def auton_switch_cross(self):
-        if self._switch_auton_mode != 'cross':
-            return 0
-        return len(list(self._filter_mode(self.events['switch'], 'auton')))
-
-    @property
-    def auton_scale_cross(self):
-        if not self.is_crossing_scale_in_auton():
-            return 0
-        return len(list(self._filter_mode(self.events['scale'], 'auton')))
-
-    @property
-    def auton_scale(self):
-        if self.is_crossing_scale_in_auton():
-            return 0
-        return len(list(self._filter_mode(self.events['scale'], 'auton')))
-
-    @property
-    def auton_drop(self):
-        return len(list(self._filter_mode(self.events['drop'], 'auton')))
-
-    @property
-    def teleop_switch(self):
-        return len(list(self._filter_mode(self.events['switch'], 'teleop')))
-
-    @property
-    def teleop_scale(self):
-        return len(list(self._filter_mode(self.events['scale'], 'teleop')))
-
-    @property
-    def teleop_oswitch(self):
-        return len(list(self._filter_mode(self.events['oswitch'], 'teleop')))
-
-    @property
-    def teleop_vault(self):
-        return len(list(self._filter_mode(self.events['vault'], 'teleop')))
-
-    @property
-    def teleop_drop(self):
-        return len(list(self._filter_mode(self.events['drop'], 'teleop')))
-
-    @property
-    def teleop_knockoff(self):
-        return len(list(self._filter_mode(self.events['knockoff'], 'teleop')))
-
-    @property
-    def end_platform(self):
-        return 'endplatform' in self.events
-
-    @property
-    def climb_success(self):
-        # If they climb success and then fall or something, make sure they
-        # didn't have a failure too.
-        return 'climbend' in self.events and 'climbfail' not in self.events
-
-    @property
-    def climb_failed(self):
-        return 'climbfail' in self.events
-
-    @property
-    def climb_time(self):
-        if not self.climb_success:
-            return None
-
-        if 'climbend' not in self.events:
-            return 0
-        if 'endplatform' not in self.events:
-            return 0
-
-        return self.events['climbend'][-1].time - self.events['endplatform'][-1].time
-
-    @property
-    def climb_carried(self):
-        if 'climbcarry1' in self.events:
-            return 1
-        elif 'climbcarry2' in self.events:
-            return 2
-        else:  # climbcarry0
-            return 0
-
-    @property
-    def time_scoring(self):
-        timeline = []
-        scores = []
-        scoring_events = ('scale', 'switch', 'oswitch', 'vault', 'drop')
-        for event, events in self.events.items():
-            if event.startswith('cube-grab'):
-                timeline.extend(events)
-            elif event in scoring_events:
-                timeline.extend(events)
-
-        # Only use teleop data
-        timeline.sort(key=lambda x: x.time)
-        mode_timeline = {
-            'auton': [],
-            'teleop': [],
-        }
-        for event in timeline:
-            mode_timeline[event.mode].append(event)
-        for mode in ['auton', 'teleop']:
-            # If the first action is scoring then ignore it since the cube is from a previous mode
-            if mode_timeline[mode] and not mode_timeline[mode][0].action.startswith('cube-grab'):
-                mode_timeline[mode].pop(0)
-            # The sequence should be cube-grab / scoring / cube-grab / scoring / etc.
-            for grab, score in grouper(mode_timeline[mode], 2):
-                if score is None:
-                    # They grabbed a cube and never did anything
-                    # with it, maybe the match ended?
-                    continue
-                if mode == 'auton' and score.action == 'scale' and self.is_crossing_scale_in_auton():
-                    action = 'scale_cross'
-                elif mode == 'auton' and score.action == 'switch':
-                    action = 'switch_' + self._switch_auton_mode
-                else:
-                    action = score.action
-                # We use an ordered dict to make database serialization reproducible
-                data = OrderedDict((
-                    ('zone', grab.action[-1]),
-                    ('score', action),
-                    ('time', score.time - grab.time),
-                    ('mode', score.mode),
-                ))
-                int(data['zone'])
-                scores.append(data)
-
-        return scores
+    def __getattr__(self, item):
+        # Every other field is a view over the reduced result
+        if item in StreamResult.__slots__:
+            return self.reduce().__getattribute__(item)
+        raise AttributeError(item)
 
 
 # Via <https://docs.python.org/3/library/itertools.html#itertools-recipes>
@@ -18,13 +18,13 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from collections import defaultdict
 from io import BytesIO
-import json
 import matplotlib; matplotlib.use('svg')  # noqa
 import matplotlib.pyplot as plot
 import numpy
 import statistics
 
-from . import models
+from . import cache, etags, models
+from .columns import ReportColumns
 
 
 class TeamSummary:
@@ -52,28 +52,112 @@ class TeamSummary:
     time_data = ['climb_time']
 
     tba_data = ['auton_cross']
+    # Everything besides the avg/min/max fields that the pages show
+    shown = ['drivebase', 'speed', 'red_card', 'died', 'noshow', 'drive_comments', 'comments', 'superscout_comments',
+             'average_time_teleop_scale', 'average_time_teleop_switch', 'average_time_teleop_oswitch',
+             'average_time_teleop_vault']
+    # Cube zones that count towards each teleop cycle time average
+    time_zones = {
+        'scale': [2, 4],
+        'switch': [1, 2],
+        'oswitch': [4, 5],
+        'vault': [1],
+    }
 
     @classmethod
-    def from_team_id(cls, team_id, before=9999):
-        return cls(team_id,
-                   models.MatchReport.query.filter(
-                       models.MatchReport.team == team_id,
-                       models.MatchReport.match < before
-                   ).all(),
-                   models.TbaMatchReport.query.filter(
-                       models.TbaMatchReport.team == team_id,
-                       models.TbaMatchReport.match < before
-                   ).all(),
-                   models.PitReport.query.filter_by(team=team_id).first(),
-                   models.SuperScoutReport.query.filter_by(team=team_id).all())
-
-    def __init__(self, team_id, reports: list, tba_reports: list, pit, superscouts: list):
+    def shared(cls, team_ids):
+        """
+        Like from_team_ids(), but the summaries come from the cache that all
+        the gunicorn workers share, and only teams nobody has summarized
+        since the data last changed are built from the database. They're
+        SummaryValues, so there are no reports or histograms.
+        """
+        team_ids = list(team_ids)
+        version = etags.data_version()
+        keys = dict((team_id, cache.key('summary', int(team_id), version)) for team_id in team_ids)
+        found = cache.get_many(set(keys.values()))
+        missing = [team_id for team_id in team_ids if keys[team_id] not in found]
+        if missing:
+            built = dict((keys[team_id], summary.values())
+                         for team_id, summary in cls.from_team_ids(missing).items())
+            cache.put_many(built)
+            found.update(built)
+        return dict((team_id, SummaryValues(team_id, found[keys[team_id]])) for team_id in team_ids)
+
+    @classmethod
+    def from_team_id(cls, team_id, before=None):
+        return cls.from_team_ids([team_id], before=before)[team_id]
+
+    @classmethod
+    def from_team_ids(cls, team_ids, before=None):
+        """
+        Build summaries for many teams at once, with one query per table
+        instead of four queries per team. Returns a dict keyed by the
+        ids that were passed in.
+
+        Without a before match, stats come from the team_aggregates
+        table instead of being recomputed from every report.
+        """
+        team_ids = list(team_ids)
+        wanted = set(int(team_id) for team_id in team_ids)
+        report_query = models.MatchReport.query.filter(models.MatchReport.team.in_(wanted))
+        tba_query = models.TbaMatchReport.query.filter(models.TbaMatchReport.team.in_(wanted))
+        if before is not None:
+            report_query = report_query.filter(models.MatchReport.match < before)
+            tba_query = tba_query.filter(models.TbaMatchReport.match < before)
+        reports = defaultdict(list)
+        for report in report_query.all():
+            reports[report.team].append(report)
+        tba_reports = defaultdict(list)
+        for tba_report in tba_query.all():
+            tba_reports[tba_report.team].append(tba_report)
+        cycle_query = models.CycleTime.query.filter(models.CycleTime.team.in_(wanted))
+        if before is not None:
+            cycle_query = cycle_query.filter(models.CycleTime.match < before)
+        cycle_times = defaultdict(list)
+        for cycle_time in cycle_query.all():
+            cycle_times[cycle_time.team].append(cycle_time)
+        if before is None:
+            stats = defaultdict(dict)
+            for agg in models.TeamAggregate.query.filter(models.TeamAggregate.team.in_(wanted)).all():
+                stats[agg.team][agg.field] = (agg.total, agg.count, agg.min, agg.max)
+        else:
+            columns = cls.columns([r for team_reports in reports.values() for r in team_reports],
+                                  [r for team_reports in tba_reports.values() for r in team_reports])
+            stats = columns.stats()
+        pits = dict((pit.team, pit) for pit in models.PitReport.query.filter(models.PitReport.team.in_(wanted)).all())
+        superscouts = defaultdict(list)
+        for superscout in models.SuperScoutReport.query.filter(models.SuperScoutReport.team.in_(wanted)).all():
+            superscouts[superscout.team].append(superscout)
+
+        summaries = {}
+        for team_id in team_ids:
+            key = int(team_id)
+            summaries[team_id] = cls(team_id, reports[key], tba_reports[key], pits.get(key), superscouts[key],
+                                     stats=stats.get(key, {}), cycle_times=cycle_times[key])
+
+        return summaries
+
+    @classmethod
+    def columns(cls, reports: list, tba_reports: list):
+        return ReportColumns(cls.data, reports, tba_reports, tba_fields=cls.tba_data, bool_fields=cls.bool_data)
+
+    def __init__(self, team_id, reports: list, tba_reports: list, pit, superscouts: list, stats=None,
+                 cycle_times=None):
         self.team_id = team_id
         self.reports = reports
         self.tba_reports = dict((r.match, r) for r in tba_reports)
         self.pit = pit
         self.superscouts = superscouts
+        if stats is None:
+            stats = self.columns(reports, tba_reports).stats().get(int(team_id), {})
+        # field -> (total, count, min, max)
+        self.stats = stats
+        if cycle_times is None:
+            cycle_times = models.CycleTime.query.filter_by(team=team_id).all()
+        self.cycle_times = cycle_times
         self._cache = {}
+        self._timedata = {}
 
     def __getattr__(self, item):
         if not item.startswith(('avg_', 'min_', 'max_')):
@@ -82,24 +166,11 @@ class TeamSummary:
             return self._cache[item]
 
         type_, field = item.split('_', 1)
-        values = []
-        for report in self.reports:
-            if field in self.tba_data:
-                tba_report = self.tba_reports.get(report.match)
-                if tba_report is None:
-                    # Haven't imported TBA data yet?
-                    continue
-                val = tba_report.__getattribute__(field)
-            else:
-                val = report.__getattribute__(field)
-            if field == 'climb_carried':
-                # Normalize to boolean, since we just want to know if they
-                # can buddy climb
-                val = bool(val)
-            if val is not None:
-                values.append(int(val))
-
-        if not values:
+        if field not in self.data:
+            raise AttributeError
+        total, count, min_, max_ = self.stats.get(field, (0, 0, None, None))
+
+        if not count:
             if field in self.bool_data:
                 val = '0%'
             elif field in self.bool_data:
@@ -109,11 +180,11 @@ class TeamSummary:
             self._cache[item] = val
             return val
         if type_ == 'avg':
-            val = round(statistics.mean(values), 2)
+            val = round(_mean(total, count), 2)
         elif type_ == 'max':
-            val = max(values)
+            val = max_
         else:  # min
-            val = min(values)
+            val = min_
 
         if field in self.bool_data:
             val = str(round(val * 100)) + '%'
@@ -123,6 +194,21 @@ class TeamSummary:
         self._cache[item] = val
         return val
 
+    def mean(self, field):
+        """Unrounded average of a field, 0 without any reports"""
+        total, count = self.stats.get(field, (0, 0, None, None))[:2]
+        if not count:
+            return 0
+        return _mean(total, count)
+
+    def values(self):
+        """Everything shown about the team, as plain values that can be pickled"""
+        values = dict((name, getattr(self, name)) for name in self.shown)
+        for field in self.data:
+            for type_ in ('avg', 'min', 'max'):
+                values[type_ + '_' + field] = self.__getattr__(type_ + '_' + field)
+        return values
+
     @property
     def drivebase(self):
         return self.pit.drive.value if self.pit else '—'
@@ -163,54 +249,42 @@ class TeamSummary:
 
     def timedata(self, mode='teleop'):
         # Split by action, then by cubezone
+        if mode in self._timedata:
+            return self._timedata[mode]
         data = defaultdict(lambda: defaultdict(list))
-        for report in self.reports:
-            score_data = json.loads(report.time_scoring)
-            for score in score_data:
-                if score['mode'] != mode:
-                    continue
-                data[score['score']][int(score['zone'])].append(score['time'])
+        for cycle_time in self.cycle_times:
+            if cycle_time.mode != mode:
+                continue
+            data[cycle_time.score][cycle_time.zone].append(cycle_time.duration_ms)
 
+        self._timedata[mode] = data
         return data
 
-    @property
-    def average_time_teleop_scale(self):
-        data = self.timedata()['scale']
+    def time_average(self, action):
+        """(mean ms or None, count) for a teleop cycle time"""
+        data = self.timedata()[action]
         merged = []
-        merged.extend(data[2])
-        merged.extend(data[4])
+        for zone in self.time_zones[action]:
+            merged.extend(data[zone])
         if not merged:
-            return ('-', 0)
-        return (round(statistics.mean(merged)/1000, 2), len(merged))
+            return (None, 0)
+        return (statistics.mean(merged), len(merged))
+
+    @property
+    def average_time_teleop_scale(self):
+        return _format_time(self.time_average('scale'))
 
     @property
     def average_time_teleop_switch(self):
-        data = self.timedata()['switch']
-        merged = []
-        merged.extend(data[1])
-        merged.extend(data[2])
-        if not merged:
-            return ('-', 0)
-        return (round(statistics.mean(merged) / 1000, 2), len(merged))
+        return _format_time(self.time_average('switch'))
 
     @property
     def average_time_teleop_oswitch(self):
-        data = self.timedata()['oswitch']
-        merged = []
-        merged.extend(data[4])
-        merged.extend(data[5])
-        if not merged:
-            return ('-', 0)
-        return (round(statistics.mean(merged) / 1000, 2), len(merged))
+        return _format_time(self.time_average('oswitch'))
 
     @property
     def average_time_teleop_vault(self):
-        data = self.timedata()['vault']
-        merged = []
-        merged.extend(data[1])
-        if not merged:
-            return ('-', 0)
-        return (round(statistics.mean(merged) / 1000, 2), len(merged))
+        return _format_time(self.time_average('vault'))
 
     def histogram(self, action, mode='teleop'):
         data = self.timedata(mode=mode)[action]
@@ -255,6 +329,39 @@ class TeamSummary:
         return f.getvalue()
 
 
+class SummaryValues:
+    """
+    What TeamSummary.values() saved, read the same way as a TeamSummary
+    """
+    data = TeamSummary.data
+
+    def __init__(self, team_id, values):
+        self.team_id = team_id
+        self.__dict__.update(values)
+
+    def __getattr__(self, item):
+        # Callers ask TeamSummary for fields with __getattr__() directly
+        try:
+            return self.__dict__[item]
+        except KeyError:
+            raise AttributeError(item)
+
+
+def _format_time(average):
+    mean, count = average
+    if mean is None:
+        return ('-', 0)
+    return (round(mean / 1000, 2), count)
+
+
+def _mean(total, count):
+    # Same as statistics.mean() on a list of ints, which stays an int if
+    # it divides evenly
+    if total % count == 0:
+        return total // count
+    return total / count
+
+
 def _bucket(data, size=5, max_=30):
     bucketed = defaultdict(int)
     for item in data:
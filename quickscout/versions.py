@@ -0,0 +1,82 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from flask import g, has_request_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import object_session
+
+from . import db, models
+
+table = models.DataVersion.__table__
+
+
+def get(name, primary=False):
+    """
+    The current version of some data, 0 if it has never changed. All the
+    versions are read with one query per database, once per request.
+
+    Inside snapshot views this is the snapshot's version, so it matches
+    what the page is rendered from. Pass primary for data that is always
+    read from the primary database.
+    """
+    bind = db.engine if primary else db.session.get_bind()
+    if not has_request_context():
+        return _load(bind).get(name, 0)
+    if 'versions' not in g:
+        g.versions = {}
+    if bind not in g.versions:
+        g.versions[bind] = _load(bind)
+    return g.versions[bind].get(name, 0)
+
+
+def refresh():
+    """Forget the versions read so far in this request"""
+    if has_request_context():
+        g.pop('versions', None)
+
+
+def _load(bind):
+    return dict(db.session.execute(select(table.c.name, table.c.version), bind_arguments={'bind': bind}).all())
+
+
+def bump(name, connection=None):
+    """
+    Say that some data changed. Doesn't commit, so the new version becomes
+    visible along with the change itself.
+    """
+    executor = db.session if connection is None else connection
+    executor.execute(table.insert().prefix_with('OR IGNORE'), {'name': name, 'version': 0})
+    executor.execute(table.update().where(table.c.name == name).values(version=table.c.version + 1))
+    refresh()
+
+
+def track(model, name):
+    """
+    Bump a version whenever rows of a model are added, changed or deleted
+    through the ORM, whichever script does it
+    """
+    def changed(mapper, connection, target):
+        bump(name, connection)
+
+    def updated(mapper, connection, target):
+        # Saving a row with the same values still counts as an update
+        if object_session(target).is_modified(target, include_collections=False):
+            bump(name, connection)
+    event.listen(model, 'after_insert', changed)
+    event.listen(model, 'after_update', updated)
+    event.listen(model, 'after_delete', changed)
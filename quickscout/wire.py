@@ -0,0 +1,124 @@
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import base64
+
+# Compact upload format for match scouting events, so phones send a few
+# bytes per button press instead of a JSON object. match_scout.js gets the
+# dictionaries below from the page, and falls back to plain JSON for
+# anything they don't cover.
+#
+# The payload is base64 of a sequence of unsigned LEB128 varints:
+#   version, base time in epoch ms,
+#   then for each event, either:
+#     0, mode index              (the mode for every following event)
+#     action index + 1, delta    (zigzag-encoded ms since the previous event,
+#                                 or since the base time for the first one)
+VERSION = 1
+# Append only, the indexes are part of the format
+ACTIONS = (
+    'mode-prematch', 'mode-auton', 'mode-teleop', 'mode-endgame',
+    'start-far', 'start-middle', 'start-close', 'start-with-cube', 'noshow', 'died',
+    'cube-grab1', 'cube-grab2', 'cube-grab3', 'cube-grab4', 'cube-grab5',
+    'switch', 'oswitch', 'scale', 'vault', 'drop', 'knockoff',
+    'endplatform', 'climbend', 'climbfail', 'climbcarry0', 'climbcarry1', 'climbcarry2',
+)
+MODES = ('prematch', 'auton', 'teleop', 'endgame', 'review')
+
+
+def dictionary():
+    """What match_scout.js needs to encode events"""
+    return {
+        'version': VERSION,
+        'actions': ACTIONS,
+        'modes': MODES,
+    }
+
+
+def encode(events):
+    """
+    Encode {action, time, mode} dicts, the way match_scout.js does. Used to
+    measure the format, the server only ever decodes.
+    """
+    numbers = [VERSION, events[0]['time'] if events else 0]
+    mode = None
+    last_time = numbers[1]
+    for event in events:
+        if event['mode'] != mode:
+            mode = event['mode']
+            numbers.extend((0, MODES.index(mode)))
+        delta = event['time'] - last_time
+        last_time = event['time']
+        numbers.extend((ACTIONS.index(event['action']) + 1, (delta << 1) ^ (delta >> 63)))
+    out = bytearray()
+    for number in numbers:
+        while number > 0x7f:
+            out.append((number & 0x7f) | 0x80)
+            number >>= 7
+        out.append(number)
+    return base64.b64encode(bytes(out)).decode('ascii')
+
+
+def decode(packed):
+    """
+    Turn a packed payload back into the {action, time, mode} dicts the JSON
+    format would have sent. Raises ValueError if it's malformed.
+    """
+    try:
+        raw = base64.b64decode(packed, validate=True)
+    except (TypeError, ValueError):
+        raise ValueError('packed events are not valid base64')
+    numbers = _varints(raw)
+    if len(numbers) < 2 or numbers[0] != VERSION:
+        raise ValueError('unsupported packed events version')
+    events = []
+    time = numbers[1]
+    mode = None
+    i = 2
+    try:
+        while i < len(numbers):
+            token = numbers[i]
+            if token == 0:
+                mode = MODES[numbers[i + 1]]
+            elif mode is None:
+                raise ValueError('packed events start without a mode')
+            else:
+                delta = numbers[i + 1]
+                time += (delta >> 1) ^ -(delta & 1)
+                events.append({'action': ACTIONS[token - 1], 'time': time, 'mode': mode})
+            i += 2
+    except IndexError:
+        raise ValueError('truncated or unknown packed events')
+    return events
+
+
+def _varints(raw):
+    numbers = []
+    number = 0
+    shift = 0
+    for byte in raw:
+        number |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            numbers.append(number)
+            number = 0
+            shift = 0
+    if shift:
+        raise ValueError('truncated varint in packed events')
+    return numbers
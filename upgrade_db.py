@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+A FRC Scouting application
+Copyright (C) 2018 Kunal Mehta <legoktm@member.fsf.org>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import json
+
+from sqlalchemy import inspect
+
+from quickscout import aggregates, db, models, save_cycle_times
+
+
+def create_indexes():
+    # create_all() only adds indexes along with new tables
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = set(index['name'] for index in inspector.get_indexes(table.name))
+        for index in table.indexes:
+            if index.name not in existing:
+                print('Creating index %s' % index.name)
+                index.create(db.engine)
+
+
+def backfill_cycle_times():
+    # Move the old JSON-encoded time_scoring into the cycletimes table
+    reports = models.MatchReport.query.filter(models.MatchReport.time_scoring.isnot(None)).all()
+    for report in reports:
+        models.CycleTime.query.filter_by(match=report.match, team=report.team).delete()
+        save_cycle_times(report.match, report.team, json.loads(report.time_scoring))
+        report.time_scoring = None
+        db.session.add(report)
+    print('Backfilled cycle times from %s match reports' % len(reports))
+
+
+def main():
+    # Create any new tables
+    db.create_all()
+    create_indexes()
+    backfill_cycle_times()
+    # Totals the pages read instead of every match report
+    aggregates.rebuild()
+    db.session.commit()
+    print('Upgraded database.')
+
+
+if __name__ == '__main__':
+    main()